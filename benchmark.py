@@ -0,0 +1,262 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Benchmarks for the hot paths: engine planning, window refresh, bulk
+# import and PDF export, on synthetic schools of several sizes.
+#
+#   python benchmark.py                      # writes benchmark.json
+#   python benchmark.py --sizes 20,1000 --compare baseline.json
+#   python benchmark.py --legacy             # also times the old loops
+#
+# Every size runs in its own process with its own database in a temporary
+# directory, because the windows always open the default database path.
+# Timings are in seconds. --compare exits with status 1 when a median got
+# slower than the baseline by more than --tolerance.
+
+SIZES = [20, 200, 1000, 5000]
+DAY = 'Monday'
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times), 'repeat': repeat}
+
+
+def bench_engine(results, absentees, repeat, seed):
+    import engine
+
+    results['engine.load_day'] = timed(lambda: engine.load_day(DAY), repeat)
+    day_tt = engine.load_day(DAY)
+    results['engine.substitute'] = timed(lambda: engine.substitute(day_tt, absentees, random.Random(seed)), repeat)
+    results['engine.balanced_substitute'] = timed(lambda: engine.balanced_substitute(day_tt, absentees), repeat)
+
+
+def legacy_free_teachers(rows, absentees):
+    # How the old loops found the free presentees of every period
+    timetable = {row[2]: row[3:] for row in rows}
+    periods = {i: [] for i in range(8)}
+    for teacher in timetable:
+        if teacher not in absentees:
+            for i, period in enumerate(timetable[teacher]):
+                if period.upper() == 'FREE':
+                    periods[i].append(teacher)
+    return periods
+
+
+def legacy_create_time_table(rows, absentees, rng):
+    # The per-cell string loops create_time_table ran before the engine,
+    # kept as they were so --legacy can measure the speed-up against them
+    timetable = {}
+    for row in rows:
+        timetable[row[2]] = row[3:]  # teacher -> periods
+
+    # Identify presentees (teachers who are not absent)
+    presentees = {teacher for teacher in timetable if teacher not in absentees}
+
+    # Prepare a structure for periods replacement
+    periods = {i: [] for i in range(8)}
+    for teacher in presentees:
+        for i, period in enumerate(timetable[teacher]):
+            if period.upper() == 'FREE':
+                periods[i].append(teacher)
+
+    # Substitute periods for absentees
+    for teacher in absentees:
+        if teacher in timetable:
+            for i, period in enumerate(timetable[teacher]):
+                if period.upper() != 'FREE' and periods[i]:
+                    replacement_teacher = rng.choice(periods[i])
+                    timetable[replacement_teacher] = (
+                        timetable[replacement_teacher][:i] + (period,) + timetable[replacement_teacher][i+1:]
+                    )
+
+            # Remove absent teacher's record
+            del timetable[teacher]
+    return timetable
+
+
+def bench_legacy(results, absentees, repeat, seed):
+    # The same random plan the old way and through the engine, with and
+    # without reading the day from the database
+    import engine
+    from database import get_db
+
+    db = get_db()
+    results['legacy.create_time_table'] = timed(
+        lambda: legacy_create_time_table(db.rows_for_day(DAY), absentees, random.Random(seed)), repeat
+    )
+    results['engine.create_time_table'] = timed(lambda: engine.create_time_table(DAY, absentees, seed=seed), repeat)
+    rows = db.rows_for_day(DAY)
+    results['legacy.substitute'] = timed(lambda: legacy_create_time_table(rows, absentees, random.Random(seed)), repeat)
+    results['legacy.free_teachers'] = timed(lambda: legacy_free_teachers(rows, absentees), repeat)
+    day_tt = engine.DayTimetable(DAY, rows)
+    results['engine.free_teachers'] = timed(
+        lambda: [day_tt.free_teachers(i, absentees) for i in range(engine.PERIOD_COUNT)], repeat
+    )
+    # Old median over new median; no 'median' key, so --compare skips it
+    results['speedup'] = {
+        name: results[f'legacy.{name}']['median'] / results[f'engine.{name}']['median']
+        for name in ('create_time_table', 'substitute', 'free_teachers')
+    }
+
+
+def bench_refresh(results, repeat):
+    # Day switches in both windows, from the query to the painted view
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5.QtWidgets import QApplication
+        from PyQt5.QtCore import QThreadPool
+    except ImportError:
+        for name in ('qt.schedule_manager.loadData', 'qt.main.update_table'):
+            results[name] = {'skipped': 'PyQt5 is not installed'}
+        return
+    app = QApplication.instance() or QApplication([])
+    from schedule_manager import ScheduleManager
+    from main import TimeTableManager
+
+    def settle():
+        QThreadPool.globalInstance().waitForDone()
+        app.processEvents()
+
+    for name, window, combo_box in [
+        ('qt.schedule_manager.loadData', ScheduleManager(), 'dayComboBox'),
+        ('qt.main.update_table', TimeTableManager(), 'day_combo_box'),
+    ]:
+        window.show()
+        settle()
+        combo_box = getattr(window, combo_box)
+        switches = iter(range(1, repeat + 1))
+
+        def switch_day():
+            combo_box.setCurrentIndex(next(switches) % combo_box.count())
+            settle()
+
+        results[name] = timed(switch_day, repeat)
+        window.close()
+
+
+def bench_pdf(results, absentees, repeat):
+    try:
+        import pdf_export
+    except ImportError:
+        results['pdf.export_days'] = {'skipped': 'reportlab is not installed'}
+        return
+    target = tempfile.mkdtemp(prefix='pdf-', dir='.')
+    results['pdf.export_days'] = timed(lambda: pdf_export.export_days([DAY], absentees, target), repeat)
+
+
+def bench_size(size, repeat, absentee_rate, seed, legacy=False):
+    # Runs in a fresh process inside its own working directory
+    import synthetic
+    from database import get_db
+
+    results = {}
+    records = synthetic.generate_school(size, seed=seed)
+    db = get_db()
+    db.migrate()
+    results['db.bulk_insert'] = timed(lambda: db.upsert_schedules(records), 1)
+    results['db.bulk_reimport'] = timed(lambda: db.upsert_schedules(records), repeat)
+
+    absentees = synthetic.pick_absentees(size, absentee_rate, seed)
+    bench_engine(results, absentees, repeat, seed)
+    if legacy:
+        bench_legacy(results, absentees, repeat, seed)
+    bench_refresh(results, repeat)
+    bench_pdf(results, absentees, max(1, repeat // 5))
+    return results
+
+
+def run_all(sizes, repeat, absentee_rate, seed, legacy=False):
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': {'repeat': repeat, 'absentee_rate': absentee_rate, 'seed': seed, 'legacy': legacy},
+        'sizes': {},
+    }
+    for size in sizes:
+        print(f'Benchmarking {size} teachers...', file=sys.stderr)
+        fd, result_file = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            subprocess.run([
+                sys.executable, os.path.abspath(__file__), '--one', str(size), '--result-file', result_file,
+                '--repeat', str(repeat), '--absentee-rate', str(absentee_rate), '--seed', str(seed),
+            ] + (['--legacy'] if legacy else []), check=True)
+            with open(result_file) as f:
+                report['sizes'][str(size)] = json.load(f)
+        finally:
+            os.remove(result_file)
+    return report
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for size, results in report['sizes'].items():
+        for name, timing in results.items():
+            before = baseline.get('sizes', {}).get(size, {}).get(name, {})
+            if 'median' in timing and 'median' in before and timing['median'] > before['median'] * (1 + tolerance):
+                found.append(f'{name} at {size} teachers: {before["median"]:.4f}s -> {timing["median"]:.4f}s')
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the substitution and UI hot paths.')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='comma separated teacher counts')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--absentee-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='baseline JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--legacy', action='store_true', help='also time the loops the engine replaced')
+    parser.add_argument('--one', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.one is not None:
+        cwd = os.getcwd()
+        work = tempfile.mkdtemp(prefix=f'timetable-bench-{args.one}-')
+        os.chdir(work)
+        try:
+            results = bench_size(args.one, args.repeat, args.absentee_rate, args.seed, args.legacy)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(work, ignore_errors=True)
+        with open(args.result_file, 'w') as f:
+            json.dump(results, f)
+        return 0
+
+    report = run_all(
+        [int(size) for size in args.sizes.split(',')], args.repeat, args.absentee_rate, args.seed, args.legacy
+    )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print(f'Slower: {line}')
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
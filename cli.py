@@ -0,0 +1,228 @@
+import argparse
+import json
+import sys
+
+# Headless front end for scripts and cron jobs:
+#
+#   python -m cli init
+#   python -m cli plan Monday T1 T4 --pdf monday.pdf
+#   python -m cli export Monday Tuesday --absent T1 --out slips/
+#   python -m cli import timetable.csv
+#   python -m cli check Monday Tuesday
+#   python -m cli search 9B thursday
+#   python -m cli coverage --away 1 5 10 --csv coverage.csv
+#   python -m cli range 2026-10-12 2026-10-23 --absent T1:2026-10-12:2026-10-16
+#   python -m cli serve --port 8080
+#
+# Nothing here imports Qt, and ReportLab is only imported by the commands
+# that write PDFs, so engine-only commands start quickly and need no display.
+# Modules are imported inside the commands for the same reason.
+
+
+def cmd_init(args):
+    from database import get_db
+    db = get_db(args.db)
+    existed = db.exists()
+    version = db.migrate()
+    print(f'{args.db} {"is at" if existed else "created with"} schema version {version}')
+
+
+def print_plan(plan):
+    for i, teacher, period, substitute in plan.assignments:
+        print(f'Period {i + 1}: {substitute} covers {period} for {teacher}')
+    for i, teacher, period in plan.uncovered:
+        print(f'Period {i + 1}: nobody free to cover {period} for {teacher}')
+    if not plan.assignments and not plan.uncovered:
+        print('Nothing to cover')
+
+
+def cmd_plan(args):
+    if args.mode == 'search':
+        import planner
+        plan, score = planner.search_day(args.day, args.absentees, args.db, seed=args.seed, budget=args.budget)
+    else:
+        import plan_cache
+        plan = plan_cache.cached_plan(args.day, args.absentees, args.db)
+
+    if args.json:
+        json.dump(plan.to_dict(), sys.stdout, indent=2)
+        print()
+    else:
+        print_plan(plan)
+    import integrity
+    for issue in integrity.check_plan(plan):
+        print(issue, file=sys.stderr)
+    if args.pdf:
+        import pdf_export
+        pdf_export.write_day_sheet(args.pdf, pdf_export.HEADERS, pdf_export.plan_rows(plan), plan.absentees)
+        print(f'Saved {args.pdf}', file=sys.stderr)
+
+
+def cmd_export(args):
+    import pdf_export
+    paths = pdf_export.export_days(
+        args.days, args.absent, args.out, combined=args.combined, workers=args.workers, db_path=args.db
+    )
+    for path in paths:
+        print(path)
+
+
+def cmd_import(args):
+    from database import get_db
+    from importer import import_timetable
+    db = get_db(args.db)
+    db.migrate()
+    result = import_timetable(args.file, db)
+    for line, message in result.errors:
+        print(f'Line {line}: {message}', file=sys.stderr)
+    for issue in result.issues:
+        print(issue, file=sys.stderr)
+    print(result.summary())
+    return 1 if result.errors else 0
+
+
+def cmd_check(args):
+    import integrity
+    from database import WORKDAYS
+    issues = integrity.check_timetable(args.days or WORKDAYS, args.db)
+    for issue in issues:
+        print(issue)
+    print(f'{len(issues)} problems found', file=sys.stderr)
+    return 1 if issues else 0
+
+
+def cmd_search(args):
+    from database import get_db
+    rows = get_db(args.db).search(' '.join(args.words), args.limit)
+    for day, period, teacher, subject, _ in rows:
+        print(f'{day} period {period}: {teacher} {subject}')
+    print(f'{len(rows)} slots found', file=sys.stderr)
+    return 0 if rows else 1
+
+
+def cmd_coverage(args):
+    import coverage_analysis
+    from database import WORKDAYS
+    days = args.days or WORKDAYS
+    report = coverage_analysis.analyse_days(
+        days, args.away, args.scenarios, args.cap or None, args.seed, args.workers, db_path=args.db
+    )
+    for day in report.days():
+        ratios = ' '.join(f'{free}/{busy}' for free, busy in report.availability[day])
+        print(f'{day}: free/busy by period {ratios}')
+        for k in report.ks():
+            swept = report.sweeps.get((day, k))
+            if swept is None:
+                continue
+            worst = [str(i + 1) for i in range(len(swept.bottlenecks)) if swept.bottlenecks[i]]
+            print(f'  {k} away: {swept.risk():.1%} of {swept.scenarios} scenarios leave classes uncovered '
+                  f'(mean {swept.mean():.2f}, max {swept.worst()})'
+                  + (f', bottleneck periods {", ".join(worst)}' if worst else ''))
+        print(f'  absorbs {report.absorbs(day)} away with nothing uncovered')
+    if args.csv:
+        report.write_csv(args.csv)
+        print(f'Saved {args.csv}', file=sys.stderr)
+
+
+def cmd_range(args):
+    import range_planner
+    absences = []
+    for spec in args.absent:
+        teacher, _, dates = spec.partition(':')
+        first, _, last = dates.partition(':')
+        absences.append((teacher, first or args.first, last or args.last))
+    for date, plan in range_planner.plan_range(args.first, args.last, absences, args.db):
+        print(f'{date.isoformat()} {plan.day}: {len(plan.assignments)} covered, {len(plan.uncovered)} uncovered')
+
+
+def cmd_serve(args):
+    import asyncio
+    import server
+    try:
+        asyncio.run(server.serve(args.db, args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    from database import DB_PATH
+
+    parser = argparse.ArgumentParser(prog='python -m cli', description='Teacher substitutions without the GUI.')
+    parser.add_argument('--db', default=DB_PATH, help=f'database file (default {DB_PATH})')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init = commands.add_parser('init', help='create or upgrade the database')
+    init.set_defaults(run=cmd_init)
+
+    plan = commands.add_parser('plan', help='plan substitutions for one day')
+    plan.add_argument('day')
+    plan.add_argument('absentees', nargs='+')
+    plan.add_argument('--mode', choices=['balanced', 'search'], default='balanced')
+    plan.add_argument('--seed', type=int, default=0, help='seed for --mode search')
+    plan.add_argument('--budget', type=float, default=0.5, help='seconds for --mode search')
+    plan.add_argument('--json', action='store_true', help='print the plan as JSON')
+    plan.add_argument('--pdf', help='also save the day sheet to this file')
+    plan.set_defaults(run=cmd_plan)
+
+    export = commands.add_parser('export', help='write day sheets and substitution slips')
+    export.add_argument('days', nargs='+')
+    export.add_argument('--absent', action='append', required=True, help='absent teacher; repeat for more')
+    export.add_argument('--out', required=True, help='folder, or PDF file with --combined')
+    export.add_argument('--combined', action='store_true')
+    export.add_argument('--workers', type=int)
+    export.set_defaults(run=cmd_export)
+
+    import_ = commands.add_parser('import', help='bulk import a CSV or XLSX timetable')
+    import_.add_argument('file')
+    import_.set_defaults(run=cmd_import)
+
+    check = commands.add_parser('check', help='look for clashes and other timetable problems')
+    check.add_argument('days', nargs='*', help='days to check (default Monday to Friday)')
+    check.set_defaults(run=cmd_check)
+
+    search = commands.add_parser('search', help='find teachers and classes across the week')
+    search.add_argument('words', nargs='+', help='e.g. 9B thursday, or a teacher name; words match as prefixes')
+    search.add_argument('--limit', type=int, default=500, help='most slots to list')
+    search.set_defaults(run=cmd_search)
+
+    coverage = commands.add_parser('coverage', help='what-if analysis of how many absences each day absorbs')
+    coverage.add_argument('days', nargs='*', help='days to analyse (default Monday to Friday)')
+    coverage.add_argument('--away', type=int, nargs='+', default=[1, 2, 5, 10], help='numbers of teachers away')
+    coverage.add_argument('--scenarios', type=int, default=10000, help='random absentee sets per day and number')
+    coverage.add_argument('--cap', type=int, default=2, help='most classes one teacher covers a day; 0 for no limit')
+    coverage.add_argument('--seed', type=int, default=0)
+    coverage.add_argument('--workers', type=int)
+    coverage.add_argument('--csv', help='also save the report as CSV')
+    coverage.set_defaults(run=cmd_coverage)
+
+    range_ = commands.add_parser('range', help='plan every school day in a date range')
+    range_.add_argument('first', help='YYYY-MM-DD')
+    range_.add_argument('last', help='YYYY-MM-DD')
+    range_.add_argument('--absent', action='append', required=True,
+                        help='TEACHER[:FIRST[:LAST]]; missing dates default to the ends of the range')
+    range_.set_defaults(run=cmd_range)
+
+    serve = commands.add_parser('serve', help='run the local HTTP/JSON service')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    serve.add_argument('--workers', type=int, default=4, help='database threads and connections')
+    serve.set_defaults(run=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    import metrics
+    argv = metrics.configure(sys.argv[1:] if argv is None else argv)
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command not in ('init', 'import'):
+        import os
+        from database import get_db
+        if not os.path.exists(args.db):
+            parser.error(f'{args.db} does not exist; run "python -m cli init" or import a timetable first')
+        get_db(args.db).migrate()
+    return args.run(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
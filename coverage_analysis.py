@@ -0,0 +1,279 @@
+import csv
+import itertools
+import math
+import operator
+import os
+import random
+import sys
+from array import array
+from collections import Counter
+
+import engine
+import integrity
+import metrics
+import process_pool
+from database import DB_PATH, WORKDAYS, get_db
+
+# What-if analysis: how many teachers can be away on a day before classes
+# go uncovered, and which periods run out first.
+#
+# Without a limit on how much one teacher covers (cap=None) the answer is
+# exact and needs no sampling. Every absent teacher either leaves a class
+# to cover or takes away a free teacher, so period i loses
+# max(0, k - free[i]) classes whoever is away. The sweeps therefore cap
+# the cover one teacher takes in a day (integrity.MAX_COVER by default),
+# which is where the choice of absentees starts to matter.
+#
+# With the cap, planning a day is a flow from periods to the free teachers
+# and its minimum cut picks a set A of periods:
+#
+#   cut(A) = sum of classes to cover outside A
+#          + sum over teachers of min(cap, free periods of theirs in A)
+#
+# Only a teacher's free-period pattern (8 bits) matters, so the terms are
+# vectors over the 256 possible A: one for the whole day, worked out once
+# per sweep, and one per pattern that each absentee adds. The vectors are
+# packed into big ints, 32 bits per entry, so a scenario is k int
+# additions and a min() over an array. The uncovered count is
+# cut(no periods) - min(cut) and the minimizing A names the bottleneck
+# periods. Tens of thousands of scenarios take seconds, and large sweeps
+# are split over a process pool.
+
+PERIOD_SETS = 1 << engine.PERIOD_COUNT
+ALL_PERIODS = PERIOD_SETS - 1
+DEFAULT_SCENARIOS = 10000
+PARALLEL_SCENARIOS = 20000
+# Sweeps are always cut into this many seeded parts, so the result does not
+# depend on the number of workers
+SWEEP_PARTS = 16
+
+_popcount = [bin(a).count('1') for a in range(PERIOD_SETS)]
+
+
+def free_patterns(day_tt):
+    # Bit i set when the teacher is free in period i, one int per teacher
+    patterns = [0] * len(day_tt)
+    for i, mask in enumerate(day_tt.free_masks):
+        for j in engine.iter_bits(mask):
+            patterns[j] |= 1 << i
+    return patterns
+
+
+def _pack(values, bias=0):
+    # A list over the 256 period sets as one int with a 32-bit field per
+    # entry, so adding up absentees is one big-int addition each
+    return int.from_bytes(array('I', [v + bias for v in values]).tobytes(), sys.byteorder)
+
+
+def _unpack(packed):
+    fields = array('I')
+    fields.frombytes(packed.to_bytes(PERIOD_SETS * fields.itemsize, sys.byteorder))
+    return fields
+
+
+def _cover_terms(pattern, cap):
+    # What one teacher adds to cut(A): their classes outside A, minus the
+    # cover they could give in A. Biased by cap to stay positive; every
+    # field gets the same bias, so differences between fields are exact.
+    busy = ALL_PERIODS & ~pattern
+    return _pack([_popcount[busy & ~a] - min(cap, _popcount[pattern & a]) for a in range(PERIOD_SETS)], cap)
+
+
+def _day_terms(patterns, cap):
+    terms = [0] * PERIOD_SETS
+    for pattern, n in Counter(patterns).items():
+        for a in range(1, PERIOD_SETS):
+            terms[a] += n * min(cap, _popcount[pattern & a])
+    return _pack(terms)
+
+
+class Sweep:
+    """Outcome of the scenarios for one day and number of absentees.
+
+    uncovered counts scenarios by uncovered classes and bottlenecks[i]
+    counts the scenarios in which period i ran out of cover.
+    """
+
+    def __init__(self, day, k, scenarios=0, uncovered=None, bottlenecks=None, exhaustive=False):
+        self.day = day
+        self.k = k
+        self.scenarios = scenarios
+        self.uncovered = uncovered if uncovered is not None else Counter()
+        self.bottlenecks = bottlenecks if bottlenecks is not None else [0] * engine.PERIOD_COUNT
+        self.exhaustive = exhaustive
+
+    def merge(self, other):
+        self.scenarios += other.scenarios
+        self.uncovered.update(other.uncovered)
+        self.bottlenecks = [a + b for a, b in zip(self.bottlenecks, other.bottlenecks)]
+
+    def risk(self):
+        # Share of scenarios with at least one uncovered class
+        if not self.scenarios:
+            return 0.0
+        return (self.scenarios - self.uncovered.get(0, 0)) / self.scenarios
+
+    def mean(self):
+        if not self.scenarios:
+            return 0.0
+        return sum(n * count for n, count in self.uncovered.items()) / self.scenarios
+
+    def worst(self):
+        return max(self.uncovered, default=0)
+
+    def bottleneck_share(self, period):
+        return self.bottlenecks[period] / self.scenarios if self.scenarios else 0.0
+
+
+def _terms(patterns, cap):
+    # Packed cut(A) terms for the whole day and for each free pattern
+    return _day_terms(patterns, cap), {pattern: _cover_terms(pattern, cap) for pattern in set(patterns)}
+
+
+def _run_scenarios(patterns, terms, absentee_sets):
+    day_terms, pattern_terms = terms
+    teacher_terms = [pattern_terms[pattern] for pattern in patterns]
+
+    uncovered = Counter()
+    bottlenecks = [0] * engine.PERIOD_COUNT
+    scenarios = 0
+    for absentees in absentee_sets:
+        cut = _unpack(sum(map(teacher_terms.__getitem__, absentees), day_terms))
+        least = min(cut)
+        short = cut[0] - least
+        uncovered[short] += 1
+        scenarios += 1
+        if short:
+            # The smallest set of periods that can't all be covered
+            a = min((a for a in range(PERIOD_SETS) if cut[a] == least), key=_popcount.__getitem__)
+            for i in range(engine.PERIOD_COUNT):
+                if a >> i & 1:
+                    bottlenecks[i] += 1
+    return scenarios, uncovered, bottlenecks
+
+
+def _sweep_worker(patterns, terms, k, count, seed, part, parts):
+    # Part `part` of `parts`; exhaustive when count is None
+    if count is None:
+        absentee_sets = itertools.islice(itertools.combinations(range(len(patterns)), k), part, None, parts)
+    else:
+        rng = random.Random(f'{seed}:{k}:{part}')
+        teachers = range(len(patterns))
+        share = count // parts + (part < count % parts)
+        absentee_sets = (rng.sample(teachers, k) for _ in range(share))
+    return _run_scenarios(patterns, terms, absentee_sets)
+
+
+def _exact_sweep(day_tt, k):
+    # With no cover limit every absentee set of size k loses the same
+    # classes, so one scenario stands for all of them
+    lost = [max(0, k - day_tt.free_count(i)) for i in range(engine.PERIOD_COUNT)]
+    short = sum(lost)
+    return Sweep(day_tt.day, k, 1, Counter({short: 1}), [int(n > 0) for n in lost], exhaustive=True)
+
+
+def sweep(day_tt, k, scenarios=DEFAULT_SCENARIOS, cap=integrity.MAX_COVER, seed=0, executor=None):
+    # Every absentee set of size k when there are no more than `scenarios`
+    # of them, otherwise `scenarios` random ones. cap=None means no limit.
+    k = min(k, len(day_tt))
+    if cap is None:
+        return _exact_sweep(day_tt, k)
+    patterns = free_patterns(day_tt)
+    terms = _terms(patterns, cap)
+    exhaustive = math.comb(len(patterns), k) <= scenarios
+    count = None if exhaustive else scenarios
+    seed = f'{seed}:{day_tt.day}'
+    result = Sweep(day_tt.day, k, exhaustive=exhaustive)
+    if executor is None:
+        outcomes = [_sweep_worker(patterns, terms, k, count, seed, part, SWEEP_PARTS) for part in range(SWEEP_PARTS)]
+    else:
+        futures = [
+            executor.submit(_sweep_worker, patterns, terms, k, count, seed, part, SWEEP_PARTS)
+            for part in range(SWEEP_PARTS)
+        ]
+        outcomes = [future.result() for future in futures]
+    for outcome in outcomes:
+        result.merge(Sweep(day_tt.day, k, *outcome))
+    return result
+
+
+def availability(day_tt):
+    # (free, busy) teacher counts for every period
+    n = len(day_tt)
+    return [(day_tt.free_count(i), n - day_tt.free_count(i)) for i in range(engine.PERIOD_COUNT)]
+
+
+class CoverageReport:
+    def __init__(self, cap):
+        self.cap = cap
+        self.availability = {}  # day -> [(free, busy)] per period
+        self.sweeps = {}  # (day, k) -> Sweep
+
+    def days(self):
+        return list(self.availability)
+
+    def ks(self):
+        return sorted({k for _, k in self.sweeps})
+
+    def ratio(self, day, period):
+        free, busy = self.availability[day][period]
+        return free / busy if busy else math.inf
+
+    def absorbs(self, day, risk=0.0):
+        # Largest swept k whose share of scenarios with uncovered classes
+        # is at most `risk`, and no smaller k exceeds it
+        best = 0
+        for k in self.ks():
+            swept = self.sweeps.get((day, k))
+            if swept is None or swept.risk() > risk:
+                break
+            best = k
+        return best
+
+    def write_csv(self, file_name):
+        # One row per day, number of absentees and period
+        with open(file_name, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([
+                'day', 'period', 'free', 'busy', 'free_busy_ratio', 'absentees', 'scenarios', 'exhaustive',
+                'risk', 'mean_uncovered', 'max_uncovered', 'bottleneck_share',
+            ])
+            for day, periods in self.availability.items():
+                for i, (free, busy) in enumerate(periods):
+                    ratio = f'{free / busy:.3f}' if busy else ''
+                    sweeps = [self.sweeps[day, k] for k in self.ks() if (day, k) in self.sweeps] or [None]
+                    for swept in sweeps:
+                        row = [day, i + 1, free, busy, ratio]
+                        if swept is not None:
+                            row += [
+                                swept.k, swept.scenarios, int(swept.exhaustive), f'{swept.risk():.4f}',
+                                f'{swept.mean():.3f}', swept.worst(), f'{swept.bottleneck_share(i):.4f}',
+                            ]
+                        writer.writerow(row)
+
+
+@metrics.timed('coverage.analyse')
+def analyse(days, ks, scenarios=DEFAULT_SCENARIOS, cap=integrity.MAX_COVER, seed=0, workers=None, progress=None):
+    # Availability for each DayTimetable in days plus a sweep for every day
+    # and k in ks. Large sweeps are spread over the shared process pool.
+    report = CoverageReport(cap)
+    days = list(days)
+    for day_tt in days:
+        report.availability[day_tt.day] = availability(day_tt)
+    jobs = [(day_tt, k) for day_tt in days for k in sorted(set(ks)) if 0 < k <= len(day_tt)]
+
+    executor = None
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and scenarios * len(jobs) >= PARALLEL_SCENARIOS:
+        executor = process_pool.get_pool(workers)
+    for done, (day_tt, k) in enumerate(jobs):
+        if progress is not None:
+            progress(done, len(jobs))
+        report.sweeps[day_tt.day, k] = sweep(day_tt, k, scenarios, cap, seed, executor)
+    return report
+
+
+def analyse_days(days=WORKDAYS, ks=(1, 2, 5, 10), scenarios=DEFAULT_SCENARIOS, cap=integrity.MAX_COVER,
+                 seed=0, workers=None, progress=None, db_path=DB_PATH):
+    week = engine.WeekTimetable(get_db(db_path).rows_for_days(days))
+    return analyse([week[day] for day in days], ks, scenarios, cap, seed, workers, progress)
@@ -0,0 +1,154 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLineEdit, QSpinBox, QComboBox, QPushButton, QTableWidget,
+    QTableWidgetItem, QLabel, QProgressBar, QFileDialog, QMessageBox
+)
+from PyQt5.QtGui import QColor
+
+import coverage_analysis
+import engine
+import integrity
+from database import WORKDAYS
+from tasks import runner
+
+# What-if coverage analysis as a heatmap: days down, periods across. The
+# first view is the free to busy ratio of each period; after a run there is
+# one view per number of absentees showing how often each period was the
+# bottleneck.
+
+
+def run_analysis(task, ks, scenarios, cap):
+    return coverage_analysis.analyse_days(WORKDAYS, ks, scenarios, cap, progress=task.report)
+
+
+def heat(value):
+    # 0 is white, 1 is full red
+    value = min(max(value, 0.0), 1.0)
+    fade = int(255 * (1 - value))
+    return QColor(255, fade, fade)
+
+
+class CoverageDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.report = None
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle('Coverage What-If')
+        self.resize(800, 450)
+        mainLayout = QVBoxLayout()
+
+        formLayout = QFormLayout()
+        self.absenteesLineEdit = QLineEdit('1, 2, 5, 10, 20')
+        self.scenariosSpinBox = QSpinBox()
+        self.scenariosSpinBox.setRange(100, 1000000)
+        self.scenariosSpinBox.setSingleStep(1000)
+        self.scenariosSpinBox.setValue(coverage_analysis.DEFAULT_SCENARIOS)
+        self.capSpinBox = QSpinBox()
+        self.capSpinBox.setRange(0, engine.PERIOD_COUNT)
+        self.capSpinBox.setSpecialValueText('No limit')
+        self.capSpinBox.setValue(integrity.MAX_COVER)
+        formLayout.addRow('Teachers away at once:', self.absenteesLineEdit)
+        formLayout.addRow('Scenarios per day:', self.scenariosSpinBox)
+        formLayout.addRow('Most covers per teacher:', self.capSpinBox)
+        mainLayout.addLayout(formLayout)
+
+        controlLayout = QHBoxLayout()
+        self.viewComboBox = QComboBox()
+        self.viewComboBox.addItem('Free / busy teachers')
+        self.viewComboBox.currentIndexChanged.connect(self.showView)
+        self.runButton = QPushButton('Run')
+        self.runButton.clicked.connect(self.runAnalysis)
+        self.exportButton = QPushButton('Export CSV')
+        self.exportButton.clicked.connect(self.exportCsv)
+        self.exportButton.setEnabled(False)
+        controlLayout.addWidget(self.viewComboBox)
+        controlLayout.addWidget(self.runButton)
+        controlLayout.addWidget(self.exportButton)
+        mainLayout.addLayout(controlLayout)
+
+        self.progressBar = QProgressBar()
+        self.progressBar.hide()
+        mainLayout.addWidget(self.progressBar)
+
+        self.table = QTableWidget(len(WORKDAYS), engine.PERIOD_COUNT)
+        self.table.setVerticalHeaderLabels(WORKDAYS)
+        self.table.setHorizontalHeaderLabels([f'Period {i + 1}' for i in range(engine.PERIOD_COUNT)])
+        mainLayout.addWidget(self.table)
+
+        self.summaryLabel = QLabel('Pick how many teachers are away and press Run.')
+        self.summaryLabel.setWordWrap(True)
+        mainLayout.addWidget(self.summaryLabel)
+        self.setLayout(mainLayout)
+
+    def runAnalysis(self):
+        try:
+            ks = sorted({int(k) for k in self.absenteesLineEdit.text().replace(',', ' ').split()})
+        except ValueError:
+            QMessageBox.warning(self, 'Error', 'Enter numbers of teachers, e.g. 1, 2, 5')
+            return
+        if not ks or ks[0] < 1:
+            QMessageBox.warning(self, 'Error', 'Enter at least one number of teachers above zero')
+            return
+
+        self.runButton.setEnabled(False)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        runner().submit(
+            ('coverage', id(self)), run_analysis, ks, self.scenariosSpinBox.value(), self.capSpinBox.value() or None,
+            on_result=self.showReport, on_error=self.analysisFailed, on_progress=self.showProgress
+        )
+
+    def showProgress(self, done, total):
+        self.progressBar.setMaximum(total)
+        self.progressBar.setValue(done)
+
+    def analysisFailed(self, e):
+        self.runButton.setEnabled(True)
+        self.progressBar.hide()
+        QMessageBox.critical(self, 'Error', f'An error occurred: {e}')
+
+    def showReport(self, report):
+        self.report = report
+        self.runButton.setEnabled(True)
+        self.exportButton.setEnabled(True)
+        self.progressBar.hide()
+
+        self.viewComboBox.blockSignals(True)
+        self.viewComboBox.clear()
+        self.viewComboBox.addItem('Free / busy teachers')
+        for k in report.ks():
+            self.viewComboBox.addItem(f'Bottlenecks with {k} away')
+        self.viewComboBox.blockSignals(False)
+        self.showView(0)
+
+        lines = [f'{day}: no uncovered class with up to {report.absorbs(day)} away' for day in report.days()]
+        self.summaryLabel.setText('\n'.join(lines))
+
+    def showView(self, index):
+        if self.report is None:
+            return
+        ks = self.report.ks()
+        for row, day in enumerate(WORKDAYS):
+            periods = self.report.availability.get(day)
+            for i in range(engine.PERIOD_COUNT):
+                if periods is None:
+                    self.table.setItem(row, i, QTableWidgetItem(''))
+                    continue
+                if index == 0:
+                    free, busy = periods[i]
+                    item = QTableWidgetItem(f'{free} / {busy}')
+                    # Redder where fewer of the teachers are free
+                    item.setBackground(heat(1 - free / max(free + busy, 1) * 2))
+                else:
+                    swept = self.report.sweeps.get((day, ks[index - 1]))
+                    share = swept.bottleneck_share(i) if swept else 0.0
+                    item = QTableWidgetItem(f'{share:.0%}')
+                    item.setBackground(heat(share))
+                self.table.setItem(row, i, item)
+        self.table.resizeColumnsToContents()
+
+    def exportCsv(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, 'Export CSV', '', 'CSV Files (*.csv)')
+        if file_name:
+            self.report.write_csv(file_name)
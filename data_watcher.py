@@ -0,0 +1,61 @@
+import os
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+import database
+
+
+class DataWatcher(QObject):
+    """Broadcasts `changed` to every open window when the database changes.
+
+    A single connection is kept open and only `PRAGMA data_version` is
+    checked on each tick. That value moves whenever another connection
+    (another window, another process) commits; the schedule change counter
+    is then read so writes that don't touch schedules (such as cached
+    substitution plans) don't make every window reload.
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, db_path=database.DB_PATH, interval=1000, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.conn = None
+        self.commits = None
+        self.version = self.read_version()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.check)
+        self.timer.start(interval)
+
+    def read_version(self):
+        if self.conn is None:
+            if not os.path.exists(self.db_path):
+                return None
+            # Private connection: data_version ignores a connection's own commits
+            self.conn = database.connect(self.db_path)
+        self.commits = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        return self.conn.execute('SELECT version FROM data_changes WHERE id = 1').fetchone()[0]
+
+    def check(self):
+        if self.conn is not None and self.conn.execute('PRAGMA data_version').fetchone()[0] == self.commits:
+            return
+        version = self.read_version()
+        if version != self.version:
+            self.version = version
+            self.changed.emit()
+
+    def notify(self):
+        # Called after writes made in this process so every window refreshes
+        # right away; the version is re-read so the next tick stays quiet.
+        self.version = self.read_version()
+        self.changed.emit()
+
+
+_watcher = None
+
+
+def watcher():
+    global _watcher
+    if _watcher is None:
+        _watcher = DataWatcher()
+    return _watcher
@@ -0,0 +1,503 @@
+import os
+import pathlib
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+import metrics
+import migrations
+
+# Data-access layer shared by the engine and every window. Each thread gets
+# one long-lived connection per database file; statements are reused from
+# sqlite3's statement cache because the SQL strings below never change.
+# `timetable` is a view over the normalized tables (see migrations.py), so
+# the wide row shape is kept for readers and legacy writers.
+
+DB_PATH = 'new_timetable.db'
+WORKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+PERIOD_COLUMNS = [f'period{i + 1}' for i in range(8)]
+
+BUSY_TIMEOUT_MS = 5000
+
+# Rows per page for the paged grids
+PAGE_SIZE = 200
+# Most slots one search returns
+SEARCH_LIMIT = 500
+# Edit batches kept for undo
+JOURNAL_BATCHES = 50
+
+INSERT_SCHEDULE = (
+    'INSERT INTO timetable (day, teacher, ' + ', '.join(PERIOD_COLUMNS) + ') '
+    'VALUES (?, ?, ' + ', '.join('?' * len(PERIOD_COLUMNS)) + ')'
+)
+UPDATE_SCHEDULE = (
+    'UPDATE timetable SET day = ?, teacher = ?, ' + ', '.join(f'{col} = ?' for col in PERIOD_COLUMNS) +
+    ' WHERE id = ?'
+)
+
+
+def connect(db_path=DB_PATH):
+    # A fresh connection with the app's settings. Most code should use
+    # get_db() instead; this is for callers that need a private connection.
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=256)
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    # WAL lets the windows read while another one writes
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+
+def connect_read_only(db_path=DB_PATH):
+    # For connection pools: may move between threads, one user at a time
+    uri = pathlib.Path(db_path).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(
+        uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=256, check_same_thread=False
+    )
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    return conn
+
+
+def _match(text):
+    # FTS5 query in which every word typed must start a word of the row, so
+    # results narrow as you type; None when there is no word to look for.
+    # \w+ never contains a quote, and FTS5 splits words like A_b itself.
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _keyset(column, id_column, value, id_, descending):
+    # WHERE clause for rows after (value, id_) in ORDER BY column, id_column.
+    # The leading column >= / <= lets SQLite start from the index range.
+    # SQLite sorts NULL first, so NULL values need their own cases.
+    op = '<' if descending else '>'
+    if column is None:
+        return f'{id_column} {op} ?', [id_]
+    if value is None:
+        if descending:
+            return f'({column} IS NULL AND {id_column} < ?)', [id_]
+        return f'({column} IS NOT NULL OR {id_column} > ?)', [id_]
+    condition = f'({column} {op}= ? AND ({column} {op} ? OR {id_column} {op} ?))'
+    if descending:
+        condition = f'({condition} OR {column} IS NULL)'
+    return condition, [value, value, id_]
+
+
+class Database:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.db_path)
+        return conn
+
+    def close(self):
+        # Closes the calling thread's connection only
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def exists(self):
+        return os.path.exists(self.db_path)
+
+    def migrate(self):
+        # Creates a new database or upgrades an older one in place
+        return migrations.migrate(self.conn)
+
+    # Reads
+
+    @metrics.timed('db.rows_for_day', rows=len)
+    def rows_for_day(self, day):
+        return self.conn.execute('SELECT * FROM timetable WHERE day = ? ORDER BY id', (day,)).fetchall()
+
+    @metrics.timed('db.rows_for_days', rows=len)
+    def rows_for_days(self, days):
+        days = list(days)
+        return self.conn.execute(
+            'SELECT * FROM timetable WHERE day IN (' + ', '.join('?' * len(days)) + ') ORDER BY id', days
+        ).fetchall()
+
+    # Keyset pages for the grids. `after` is the last row of the previous
+    # page (None for the first); rows come back ordered by the sort column
+    # and then id, and the next page starts right after `after` through an
+    # index instead of skipping rows with OFFSET.
+
+    @metrics.timed('db.schedule_page', rows=len)
+    def schedule_page(self, day, after=None, limit=PAGE_SIZE, sort=0, descending=False, search=''):
+        # sort is a column of the wide row: 2 is the teacher, 3 to 10 the
+        # periods and anything else the id
+        source = 'timetable tt'
+        id_column = 'tt.id'
+        where = ['tt.day = ?']
+        params = [day]
+        if sort == 2:
+            # Walk the teachers in name order instead of sorting the whole day
+            column = 'k.name'
+            source = 'teachers k CROSS JOIN timetable tt ON tt.teacher = k.name'
+        elif 3 <= sort < 3 + len(PERIOD_COLUMNS):
+            # k.schedule_id is the same id, but the index is ordered by it
+            column, id_column = 'k.subject', 'k.schedule_id'
+            source = (
+                'timetable tt JOIN slots k ON k.schedule_id = tt.id AND k.period = ? '
+                'AND k.day_id = (SELECT id FROM days WHERE name = ?)'
+            )
+            params = [sort - 2, day] + params
+        else:
+            column = sort = None
+        if search:
+            # Schedules with a slot matching the words, from the search index.
+            # Matching the day there as well keeps the set to one day's slots.
+            match = _match(search)
+            if match is None:
+                return []
+            where.append('tt.id IN (SELECT rowid >> 4 FROM slot_search WHERE slot_search MATCH ?)')
+            params.append('day : "' + day.replace('"', '""') + f'" AND ({match})')
+        if after is not None:
+            condition, values = _keyset(column, id_column, None if sort is None else after[sort], after[0], descending)
+            where.append(condition)
+            params += values
+        direction = ' DESC' if descending else ''
+        order = f'{id_column}{direction}' if column is None else f'{column}{direction}, {id_column}{direction}'
+        return self.conn.execute(
+            f'SELECT tt.* FROM {source} WHERE {" AND ".join(where)} ORDER BY {order} LIMIT ?',
+            params + [limit]
+        ).fetchall()
+
+    @metrics.timed('db.teacher_page', rows=len)
+    def teacher_page(self, after=None, limit=PAGE_SIZE, sort=0, descending=False, search=''):
+        # (name,) rows; names are unique so they are their own key and the
+        # only column to sort by
+        where = []
+        params = []
+        if search:
+            match = _match(search)
+            if match is None:
+                return []
+            where.append('id IN (SELECT rowid FROM teacher_search WHERE teacher_search MATCH ?)')
+            params.append(match)
+        if after is not None:
+            where.append('name < ?' if descending else 'name > ?')
+            params.append(after[0])
+        return self.conn.execute(
+            'SELECT name FROM teachers' + (' WHERE ' + ' AND '.join(where) if where else '') +
+            ' ORDER BY name' + (' DESC' if descending else '') + ' LIMIT ?',
+            params + [limit]
+        ).fetchall()
+
+    @metrics.timed('db.search', rows=len)
+    def search(self, text, limit=SEARCH_LIMIT):
+        # (day, period, teacher, class, key) for the slots matching every
+        # word typed, across the week: "9B thursday" finds where class 9B
+        # is on Thursday and "smith" all of Smith's periods. The search
+        # index does the matching, so a keystroke costs a lookup, not a scan
+        # of the timetable. At most `limit` slots, taken in schedule order
+        # and then sorted by day, teacher and period.
+        match = _match(text)
+        if match is None:
+            return []
+        rows = self.conn.execute(
+            'SELECT day, rowid & 15, teacher, subject, rowid FROM slot_search '
+            'WHERE slot_search MATCH ? ORDER BY rowid LIMIT ?',
+            (match, limit)
+        ).fetchall()
+        order = {day: i for i, day in enumerate(WORKDAYS)}
+        rows.sort(key=lambda row: (order.get(row[0], len(order)), row[0], row[2], row[1]))
+        return rows
+
+    @metrics.timed('db.teachers', rows=len)
+    def teachers(self):
+        rows = self.conn.execute('SELECT name FROM teachers ORDER BY name').fetchall()
+        return [row[0] for row in rows]
+
+    def data_version(self):
+        # Persistent counter bumped by triggers on every schedule change
+        return self.conn.execute('SELECT version FROM data_changes WHERE id = 1').fetchone()[0]
+
+    @metrics.timed('db.free_teachers', rows=len)
+    def free_teachers(self, day, period, exclude=()):
+        # period is 1-based like the period columns; exclude takes out
+        # absentees so the result is the list of possible substitutes
+        exclude = list(exclude)
+        rows = self.conn.execute(
+            'SELECT DISTINCT t.name FROM free_slots f '
+            'JOIN teachers t ON t.id = f.teacher_id '
+            'WHERE f.day_id = (SELECT id FROM days WHERE name = ?) AND f.period = ? '
+            'AND t.name NOT IN (' + ', '.join('?' * len(exclude)) + ') '
+            'ORDER BY t.name',
+            (day, period, *exclude)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    @metrics.timed('db.free_grid', rows=len)
+    def free_grid(self, day):
+        # (period, teacher) for every free slot of the day, in one query
+        return self.conn.execute(
+            'SELECT DISTINCT f.period, t.name FROM free_slots f '
+            'JOIN teachers t ON t.id = f.teacher_id '
+            'WHERE f.day_id = (SELECT id FROM days WHERE name = ?) '
+            'ORDER BY f.period, t.name',
+            (day,)
+        ).fetchall()
+
+    @metrics.timed('db.free_counts')
+    def free_counts(self, day):
+        # {period: number of free teachers}; periods with nobody free are left out
+        return dict(self.conn.execute(
+            'SELECT period, count(DISTINCT teacher_id) FROM free_slots '
+            'WHERE day_id = (SELECT id FROM days WHERE name = ?) GROUP BY period',
+            (day,)
+        ).fetchall())
+
+    # Schedule writes
+
+    @metrics.timed('db.add_schedule')
+    def add_schedule(self, day, teacher, periods):
+        with self.conn:
+            self.conn.execute(INSERT_SCHEDULE, (day, teacher, *periods))
+
+    @metrics.timed('db.update_schedule')
+    def update_schedule(self, id_, day, teacher, periods):
+        with self.conn:
+            self.conn.execute(UPDATE_SCHEDULE, (day, teacher, *periods, id_))
+
+    @metrics.timed('db.delete_schedule')
+    def delete_schedule(self, id_):
+        with self.conn:
+            self.conn.execute('DELETE FROM timetable WHERE id = ?', (id_,))
+
+    # Batches of cell edits, with undo and redo
+
+    @metrics.timed('db.apply_edits')
+    def apply_edits(self, edits):
+        # edits: (schedule_id, period, subject) cells, written in one
+        # transaction. Cells that don't change are skipped. The old and new
+        # text go into the journal as one batch, which also ends anything
+        # that could still be redone. Returns the batch id, or None when
+        # nothing changed.
+        with self.conn:
+            batch = self.conn.execute('INSERT INTO edit_batches (created) VALUES (?)', (time.time(),)).lastrowid
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO edit_journal (batch, schedule_id, period, old_subject, new_subject) '
+                'SELECT ?, schedule_id, period, subject, ? FROM slots '
+                'WHERE schedule_id = ? AND period = ? AND subject IS NOT ?',
+                [(batch, subject, id_, period, subject) for id_, period, subject in edits]
+            )
+            if not self._replay(batch, 'old_subject', 'new_subject'):
+                self.conn.execute('DELETE FROM edit_batches WHERE id = ?', (batch,))
+                return None
+            self.conn.execute('DELETE FROM edit_batches WHERE undone OR id <= ?', (batch - JOURNAL_BATCHES,))
+        return batch
+
+    def undo_edits(self):
+        # Reverts the last batch still applied; returns the number of cells
+        # put back, or None when there is nothing to undo
+        with self.conn:
+            batch = self.conn.execute('SELECT max(id) FROM edit_batches WHERE NOT undone').fetchone()[0]
+            if batch is None:
+                return None
+            self.conn.execute('UPDATE edit_batches SET undone = 1 WHERE id = ?', (batch,))
+            return self._replay(batch, 'new_subject', 'old_subject')
+
+    def redo_edits(self):
+        # Applies the last undone batch again
+        with self.conn:
+            batch = self.conn.execute('SELECT min(id) FROM edit_batches WHERE undone').fetchone()[0]
+            if batch is None:
+                return None
+            self.conn.execute('UPDATE edit_batches SET undone = 0 WHERE id = ?', (batch,))
+            return self._replay(batch, 'old_subject', 'new_subject')
+
+    def _replay(self, batch, from_column, to_column):
+        # One statement moves every cell of the batch from one side of the
+        # journal to the other. Cells changed since by something else are
+        # left alone rather than overwritten.
+        journal = 'FROM edit_journal j WHERE j.batch = ? AND j.schedule_id = slots.schedule_id AND j.period = slots.period'
+        return self.conn.execute(
+            f'UPDATE slots SET subject = (SELECT j.{to_column} {journal}) '
+            'WHERE (schedule_id, period) IN (SELECT schedule_id, period FROM edit_journal WHERE batch = ?) '
+            f'AND subject IS (SELECT j.{from_column} {journal})',
+            (batch, batch, batch)
+        ).rowcount
+
+    # Teacher writes
+
+    def add_teacher(self, teacher, periods=('FREE',) * 8, days=WORKDAYS):
+        with self.conn:
+            self.conn.executemany(INSERT_SCHEDULE, [(day, teacher, *periods) for day in days])
+
+    def rename_teacher(self, old_teacher, new_teacher):
+        if new_teacher == old_teacher:
+            return
+        with self.conn:
+            row = self.conn.execute('SELECT id FROM teachers WHERE name = ?', (new_teacher,)).fetchone()
+            if row is None:
+                self.conn.execute('UPDATE teachers SET name = ? WHERE name = ?', (new_teacher, old_teacher))
+                return
+            # Renaming onto an existing teacher merges their schedules
+            self.conn.execute(
+                'UPDATE schedules SET teacher_id = ? '
+                'WHERE teacher_id = (SELECT id FROM teachers WHERE name = ?)',
+                (row[0], old_teacher)
+            )
+            self.conn.execute('DELETE FROM teachers WHERE name = ?', (old_teacher,))
+
+    @metrics.timed('db.upsert_schedules', rows=sum)
+    def upsert_schedules(self, records):
+        # Bulk load (day, teacher, *periods) records in one transaction.
+        # A (day, teacher) that already exists is updated in place, so a
+        # file can be imported again; within one batch the last record wins.
+        # Returns (inserted, updated).
+        subject = migrations.subject_of('i.')
+        with self.conn:
+            self.conn.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS import_rows ('
+                'day TEXT NOT NULL, teacher TEXT NOT NULL, ' + ', '.join(f'{col} TEXT' for col in PERIOD_COLUMNS) +
+                ', PRIMARY KEY (day, teacher))'
+            )
+            self.conn.execute('DELETE FROM temp.import_rows')
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO temp.import_rows VALUES (' + ', '.join('?' * (2 + len(PERIOD_COLUMNS))) + ')',
+                records
+            )
+            self.conn.execute('INSERT OR IGNORE INTO days (name) SELECT DISTINCT day FROM temp.import_rows')
+            self.conn.execute('INSERT OR IGNORE INTO teachers (name) SELECT DISTINCT teacher FROM temp.import_rows')
+            total = self.conn.execute('SELECT count(*) FROM temp.import_rows').fetchone()[0]
+            inserted = self.conn.execute(
+                'INSERT INTO schedules (day_id, teacher_id) '
+                'SELECT d.id, t.id FROM temp.import_rows i '
+                'JOIN days d ON d.name = i.day JOIN teachers t ON t.name = i.teacher '
+                'WHERE NOT EXISTS (SELECT 1 FROM schedules WHERE day_id = d.id AND teacher_id = t.id)'
+            ).rowcount
+            # Slots whose text is unchanged are left alone, so importing a
+            # file again only touches the triggers and indexes for real
+            # changes. New slots go in in slot order, which keeps the search
+            # index writes sequential.
+            self.conn.execute(
+                'INSERT INTO slots (schedule_id, day_id, teacher_id, period, subject, is_free) '
+                f'SELECT s.id, s.day_id, s.teacher_id, p.period, {subject}, '
+                f'{migrations.IS_FREE_SQL.format(subject)} '
+                'FROM temp.import_rows i '
+                'JOIN days d ON d.name = i.day JOIN teachers t ON t.name = i.teacher '
+                'JOIN schedules s ON s.id = ('
+                'SELECT min(id) FROM schedules WHERE day_id = d.id AND teacher_id = t.id), '
+                f'({migrations.PERIOD_NUMBERS}) p '
+                'WHERE true ORDER BY s.id, p.period '
+                'ON CONFLICT (schedule_id, period) DO UPDATE SET subject = excluded.subject, is_free = excluded.is_free '
+                'WHERE subject IS NOT excluded.subject'
+            )
+            self.conn.execute('DELETE FROM temp.import_rows')
+        return inserted, total - inserted
+
+    # Cached substitution plans
+
+    def substitution_run(self, day, absentees, load, mode, version):
+        row = self.conn.execute(
+            'SELECT plan FROM substitution_runs '
+            'WHERE day = ? AND absentees = ? AND load = ? AND mode = ? AND data_version = ?',
+            (day, absentees, load, mode, version)
+        ).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute(
+                'UPDATE substitution_runs SET last_used = ? '
+                'WHERE day = ? AND absentees = ? AND load = ? AND mode = ?',
+                (time.time(), day, absentees, load, mode)
+            )
+        return row[0]
+
+    def save_substitution_run(self, day, absentees, load, mode, version, plan, keep):
+        # Keeps the `keep` most recently used runs; plans for older data go first
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO substitution_runs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (day, absentees, load, mode, version, plan, time.time())
+            )
+            self.conn.execute('DELETE FROM substitution_runs WHERE data_version < ?', (version,))
+            self.conn.execute(
+                'DELETE FROM substitution_runs WHERE rowid NOT IN ('
+                'SELECT rowid FROM substitution_runs ORDER BY last_used DESC LIMIT ?)',
+                (keep,)
+            )
+
+    def save_date_plans(self, records):
+        # records: (date, day, absentees, data_version, plan); a date that
+        # was planned before is overwritten
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO substitution_dates VALUES (?, ?, ?, ?, ?)', records)
+
+    def date_plans(self, first, last):
+        # ISO dates sort as text, so the range is a plain BETWEEN
+        return self.conn.execute(
+            'SELECT date, day, absentees, data_version, plan FROM substitution_dates '
+            'WHERE date BETWEEN ? AND ? ORDER BY date',
+            (first, last)
+        ).fetchall()
+
+    def delete_teacher(self, teacher):
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM slots WHERE teacher_id = (SELECT id FROM teachers WHERE name = ?)', (teacher,)
+            )
+            self.conn.execute(
+                'DELETE FROM schedules WHERE teacher_id = (SELECT id FROM teachers WHERE name = ?)', (teacher,)
+            )
+            self.conn.execute('DELETE FROM teachers WHERE name = ?', (teacher,))
+
+
+class PooledDatabase(Database):
+    # The same reads over one fixed connection instead of one per thread
+    def __init__(self, db_path, conn):
+        super().__init__(db_path)
+        self._conn = conn
+
+    @property
+    def conn(self):
+        return self._conn
+
+    def close(self):
+        self._conn.close()
+
+
+class ReadOnlyPool:
+    """A fixed number of read-only connections, each lent to one caller at a time."""
+
+    def __init__(self, db_path=DB_PATH, size=4):
+        self.db_path = db_path
+        self.idle = queue.LifoQueue()
+        for _ in range(size):
+            self.idle.put(PooledDatabase(db_path, connect_read_only(db_path)))
+        self.size = size
+
+    def run(self, fn, *args):
+        # Calls fn(db, *args), waiting for a free connection if needed
+        db = self.idle.get()
+        try:
+            return fn(db, *args)
+        finally:
+            self.idle.put(db)
+
+    def close(self):
+        for _ in range(self.size):
+            self.idle.get().close()
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_db(db_path=DB_PATH):
+    with _databases_lock:
+        db = _databases.get(db_path)
+        if db is None:
+            db = _databases[db_path] = Database(db_path)
+        return db
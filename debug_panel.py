@@ -0,0 +1,80 @@
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QCheckBox, QFileDialog,
+    QLineEdit, QLabel
+)
+from PyQt5.QtCore import QTimer
+
+import metrics
+
+# Live view of the metrics registry, refreshed once a second
+
+
+class DebugPanel(QWidget):
+    COLUMNS = ['Operation', 'Calls', 'Total ms', 'Mean ms', 'Max ms', 'Rows']
+
+    def __init__(self):
+        super().__init__()
+        self.initUI()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.loadData)
+        self.timer.start(1000)
+
+    def initUI(self):
+        self.setWindowTitle('Debug Metrics')
+        self.setGeometry(150, 150, 800, 500)
+        mainLayout = QVBoxLayout()
+
+        controlLayout = QHBoxLayout()
+        self.enabledCheckBox = QCheckBox('Record metrics')
+        self.enabledCheckBox.setChecked(metrics.enabled())
+        self.enabledCheckBox.toggled.connect(metrics.enable)
+        controlLayout.addWidget(self.enabledCheckBox)
+        controlLayout.addWidget(QLabel('Profile:'))
+        self.profileLineEdit = QLineEdit(metrics._profile or '')
+        self.profileLineEdit.setPlaceholderText('operation name, e.g. engine.balanced_substitute')
+        self.profileLineEdit.editingFinished.connect(
+            lambda: metrics.profile(self.profileLineEdit.text().strip() or None)
+        )
+        controlLayout.addWidget(self.profileLineEdit)
+        mainLayout.addLayout(controlLayout)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        mainLayout.addWidget(self.table)
+
+        buttonLayout = QHBoxLayout()
+        self.resetButton = QPushButton('Reset')
+        self.saveJsonButton = QPushButton('Save JSON')
+        self.saveTraceButton = QPushButton('Save Chrome Trace')
+        self.resetButton.clicked.connect(self.resetMetrics)
+        self.saveJsonButton.clicked.connect(lambda: self.saveFile('Save metrics', metrics.dump_json))
+        self.saveTraceButton.clicked.connect(lambda: self.saveFile('Save trace', metrics.dump_chrome_trace))
+        buttonLayout.addWidget(self.resetButton)
+        buttonLayout.addWidget(self.saveJsonButton)
+        buttonLayout.addWidget(self.saveTraceButton)
+        mainLayout.addLayout(buttonLayout)
+
+        self.setLayout(mainLayout)
+        self.loadData()
+
+    def loadData(self):
+        stats = metrics.snapshot()
+        self.table.setRowCount(len(stats))
+        for row, (name, stat) in enumerate(stats.items()):
+            values = [
+                name, stat['calls'], f"{stat['total_ms']:.1f}", f"{stat['mean_ms']:.2f}",
+                f"{stat['max_ms']:.2f}", stat['rows']
+            ]
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(str(value)))
+
+    def resetMetrics(self):
+        metrics.reset()
+        self.loadData()
+
+    def saveFile(self, title, dump):
+        file_name, _ = QFileDialog.getSaveFileName(self, title, '', 'JSON Files (*.json)')
+        if file_name:
+            dump(file_name)
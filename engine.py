@@ -0,0 +1,443 @@
+import sys
+import random
+import heapq
+from array import array
+
+import metrics
+from database import DB_PATH, get_db
+
+# Headless substitution engine shared by algorithm.py and the Qt windows.
+# Nothing in here may import PyQt5 so it can run from scripts and cron jobs.
+
+PERIOD_COUNT = 8
+
+# Assignment modes
+RANDOM = 'random'
+BALANCED = 'balanced'
+SEARCH = 'search'
+
+
+def is_free(period):
+    # Same rule as migrations.IS_FREE_SQL: NULL, blank, 'None' and any
+    # spelling of FREE mean the teacher has no class
+    return period is None or period.strip(' ').upper() in ('FREE', 'NONE', '')
+
+
+def iter_bits(mask):
+    # Yield the index of every set bit, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class SubjectTable:
+    """Interns period texts as small integer codes shared by every day.
+
+    Code 0 is an empty (NULL) cell. free[code] caches is_free() so no
+    string is looked at again after loading.
+    """
+
+    __slots__ = ('names', 'codes', 'free')
+
+    def __init__(self):
+        self.names = [None]
+        self.codes = {None: 0}
+        self.free = [True]
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            if isinstance(name, str):
+                name = sys.intern(name)
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+            self.free.append(is_free(name))
+        return code
+
+
+SUBJECTS = SubjectTable()
+
+
+class DayTimetable:
+    """One day of the timetable stored as interned subject codes.
+
+    cells is a flat array('H') with PERIOD_COUNT codes per teacher and
+    free_masks[i] has bit j set when teacher j is free in period i. Slots
+    are updated in place; rows are turned back into text tuples only when
+    asked for, and cached until the row changes.
+    """
+
+    __slots__ = ('day', 'subjects', 'teachers', 'index', 'cells', 'free_masks', '_free_lists', '_row_cache')
+
+    def __init__(self, day, rows=(), subjects=SUBJECTS):
+        self.day = day
+        self.subjects = subjects
+        self.teachers = []
+        self.index = {}
+
+        known = subjects.codes
+        code = subjects.code
+        cells = []
+        # The loaded text tuples start out as the row cache, so a plan only
+        # builds tuples for the rows it changes
+        row_cache = []
+        for row in rows:
+            teacher = row[2]
+            periods = tuple(row[3:3 + PERIOD_COUNT])
+            codes = [known[period] if period in known else code(period) for period in periods]
+            j = self.index.get(teacher)
+            if j is None:
+                self.index[teacher] = len(self.teachers)
+                self.teachers.append(teacher)
+                cells.extend(codes)
+                row_cache.append(periods)
+            else:
+                # Later rows win, like the old dict based loader
+                cells[j * PERIOD_COUNT:(j + 1) * PERIOD_COUNT] = codes
+                row_cache[j] = periods
+        self.cells = array('H', cells)
+
+        free = subjects.free
+        self.free_masks = [
+            sum(1 << j for j, c in enumerate(cells[i::PERIOD_COUNT]) if free[c])
+            for i in range(PERIOD_COUNT)
+        ]
+        self._free_lists = [None] * PERIOD_COUNT
+        self._row_cache = row_cache
+
+    def __len__(self):
+        return len(self.teachers)
+
+    def copy(self):
+        # teachers and index never change after loading, so they are shared
+        other = DayTimetable.__new__(DayTimetable)
+        other.day = self.day
+        other.subjects = self.subjects
+        other.teachers = self.teachers
+        other.index = self.index
+        other.cells = array('H', self.cells)
+        other.free_masks = list(self.free_masks)
+        other._free_lists = list(self._free_lists)
+        other._row_cache = list(self._row_cache)
+        return other
+
+    def nbytes(self):
+        return self.cells.itemsize * len(self.cells) + sum((mask.bit_length() + 7) // 8 for mask in self.free_masks)
+
+    def code(self, j, i):
+        return self.cells[j * PERIOD_COUNT + i]
+
+    def cell(self, j, i):
+        return self.subjects.names[self.cells[j * PERIOD_COUNT + i]]
+
+    def set_code(self, j, i, code):
+        self.cells[j * PERIOD_COUNT + i] = code
+        self._row_cache[j] = None
+        self._free_lists[i] = None
+        if self.subjects.free[code]:
+            self.free_masks[i] |= 1 << j
+        else:
+            self.free_masks[i] &= ~(1 << j)
+
+    def set_cell(self, j, i, period):
+        self.set_code(j, i, self.subjects.code(period))
+
+    def row(self, j):
+        row = self._row_cache[j]
+        if row is None:
+            names = self.subjects.names
+            row = self._row_cache[j] = tuple(names[c] for c in self.cells[j * PERIOD_COUNT:(j + 1) * PERIOD_COUNT])
+        return row
+
+    def free_list(self, period):
+        # Free teacher indices for one period, for O(1) random picks
+        free = self._free_lists[period]
+        if free is None:
+            free = self._free_lists[period] = list(iter_bits(self.free_masks[period]))
+        return free
+
+    def mask_of(self, teachers):
+        mask = 0
+        for teacher in teachers:
+            j = self.index.get(teacher)
+            if j is not None:
+                mask |= 1 << j
+        return mask
+
+    def free_teachers(self, period, exclude=()):
+        mask = self.free_masks[period] & ~self.mask_of(exclude)
+        return [self.teachers[j] for j in iter_bits(mask)]
+
+    def free_count(self, period, exclude=()):
+        return bin(self.free_masks[period] & ~self.mask_of(exclude)).count('1')
+
+    def as_dict(self, exclude_mask=0):
+        return {
+            teacher: self.row(j)
+            for j, teacher in enumerate(self.teachers)
+            if not exclude_mask >> j & 1
+        }
+
+
+class WeekTimetable:
+    """Several days loaded together, sharing one SubjectTable."""
+
+    __slots__ = ('subjects', 'days')
+
+    def __init__(self, rows=(), subjects=SUBJECTS):
+        self.subjects = subjects
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row[1], []).append(row)
+        self.days = {day: DayTimetable(day, day_rows, subjects) for day, day_rows in by_day.items()}
+
+    def __getitem__(self, day):
+        day_tt = self.days.get(day)
+        if day_tt is None:
+            day_tt = self.days[day] = DayTimetable(day, (), self.subjects)
+        return day_tt
+
+    def __iter__(self):
+        return iter(self.days.values())
+
+    def nbytes(self):
+        return sum(day_tt.nbytes() for day_tt in self.days.values())
+
+
+@metrics.timed('engine.load_day', rows=len)
+def load_day(day, db_path=DB_PATH):
+    return DayTimetable(day, get_db(db_path).rows_for_day(day))
+
+
+@metrics.timed('engine.load_week', rows=lambda week: sum(map(len, week)))
+def load_week(days, db_path=DB_PATH):
+    return WeekTimetable(get_db(db_path).rows_for_days(days))
+
+
+def _covers(day_tt, j, i):
+    # Code of the class teacher j teaches in period i, or 0 if nothing to cover
+    code = day_tt.code(j, i)
+    if not day_tt.subjects.names[code] or day_tt.free_masks[i] >> j & 1:
+        return 0
+    return code
+
+
+@metrics.timed('engine.substitute')
+def substitute(day_tt, absentees, rng=random):
+    absent_mask = day_tt.mask_of(absentees)
+    result = day_tt.copy()
+
+    # Substitute periods for absentees
+    for j in iter_bits(absent_mask):
+        for i in range(PERIOD_COUNT):
+            code = _covers(day_tt, j, i)
+            if not code or not day_tt.free_masks[i] & ~absent_mask:
+                continue
+            # Rejection sampling keeps the pick uniform over free presentees
+            free = day_tt.free_list(i)
+            replacement = free[int(rng.random() * len(free))]
+            while absent_mask >> replacement & 1:
+                replacement = free[int(rng.random() * len(free))]
+            result.set_code(replacement, i, code)
+
+    # Absent teachers' records are dropped from the result
+    return result.as_dict(absent_mask)
+
+
+class SubstitutionPlan:
+    """Result of a planning run.
+
+    assignments holds (period, absent teacher, class, substitute) tuples and
+    uncovered holds (period, absent teacher, class) for classes nobody could
+    take. Periods are 0-based like the timetable tuples.
+    """
+
+    def __init__(self, day, timetable, assignments, uncovered, load, absentees=()):
+        self.day = day
+        self.timetable = timetable
+        self.assignments = assignments
+        self.uncovered = uncovered
+        self.load = load
+        self.absentees = sorted(absentees)
+
+    def uncovered_periods(self):
+        return sorted({period for period, _, _ in self.uncovered})
+
+    def to_dict(self):
+        # Plain lists and dicts only, so a plan can be stored as JSON
+        return {
+            'day': self.day,
+            'timetable': [[teacher, list(periods)] for teacher, periods in self.timetable.items()],
+            'assignments': [list(a) for a in self.assignments],
+            'uncovered': [list(u) for u in self.uncovered],
+            'load': self.load,
+            'absentees': self.absentees,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['day'],
+            {teacher: tuple(periods) for teacher, periods in data['timetable']},
+            [tuple(a) for a in data['assignments']],
+            [tuple(u) for u in data['uncovered']],
+            data['load'],
+            data.get('absentees', ()),
+        )
+
+
+def _match_period(classes, teachers, load):
+    # classes: [(absent index, class)], teachers: free present indices.
+    # Every free teacher can take every class at the same cost, their current
+    # load, so the best match gives the classes in order to the least loaded
+    # teachers. Classes left over when the teachers run out stay uncovered.
+    picks = heapq.nsmallest(len(classes), teachers, key=lambda k: (load[k], k))
+    return list(enumerate(picks))
+
+
+@metrics.timed('engine.balanced_substitute', rows=lambda plan: len(plan.assignments))
+def balanced_substitute(day_tt, absentees, load=None, progress=None):
+    absent_mask = day_tt.mask_of(absentees)
+    teachers = day_tt.teachers
+    names = day_tt.subjects.names
+    result = day_tt.copy()
+
+    # load[k] starts from substitutions already given out this week
+    load = [0] * len(day_tt) if load is None else [load.get(t, 0) for t in teachers]
+
+    assignments = []
+    uncovered = []
+    for i in range(PERIOD_COUNT):
+        if progress is not None:
+            progress(i, PERIOD_COUNT)
+        classes = [(j, _covers(day_tt, j, i)) for j in iter_bits(absent_mask)]
+        classes = [(j, code) for j, code in classes if code]
+        if not classes:
+            continue
+        free = list(iter_bits(day_tt.free_masks[i] & ~absent_mask))
+        matched = set()
+        for c, k in _match_period(classes, free, load):
+            j, code = classes[c]
+            result.set_code(k, i, code)
+            load[k] += 1
+            matched.add(c)
+            assignments.append((i, teachers[j], names[code], teachers[k]))
+        uncovered.extend(
+            (i, teachers[j], names[code])
+            for c, (j, code) in enumerate(classes)
+            if c not in matched
+        )
+
+    return SubstitutionPlan(
+        day_tt.day, result.as_dict(absent_mask), assignments, uncovered, dict(zip(teachers, load)), absentees
+    )
+
+
+class PlanDiff:
+    """Substitutions a replan added and took away, so only those teachers need telling."""
+
+    def __init__(self, added, removed):
+        self.added = added
+        self.removed = removed
+
+    def __bool__(self):
+        return bool(self.added or self.removed)
+
+
+def _still_valid(day_tt, absent_mask, assignment):
+    i, absent, period, substitute = assignment
+    j = day_tt.index.get(absent)
+    k = day_tt.index.get(substitute)
+    if j is None or k is None or not absent_mask >> j & 1 or absent_mask >> k & 1:
+        return False
+    code = _covers(day_tt, j, i)
+    return bool(code) and day_tt.subjects.names[code] == period and day_tt.free_masks[i] >> k & 1
+
+
+@metrics.timed('engine.replan', rows=lambda result: len(result[1].added) + len(result[1].removed))
+def replan(day_tt, plan, absentees):
+    # Updates a committed plan for a changed absentee list. Only periods
+    # touched by teachers joining or leaving the list (or by assignments
+    # that no longer fit the timetable) are matched again, and every
+    # assignment that is still valid is kept, so nobody's cover moves.
+    absent_mask = day_tt.mask_of(absentees)
+    changed = absent_mask ^ day_tt.mask_of(plan.absentees)
+    teachers = day_tt.teachers
+    names = day_tt.subjects.names
+
+    affected = set()
+    for j in iter_bits(changed):
+        affected.update(i for i in range(PERIOD_COUNT) if _covers(day_tt, j, i) or day_tt.free_masks[i] >> j & 1)
+    kept = []
+    removed = []
+    for assignment in plan.assignments:
+        if _still_valid(day_tt, absent_mask, assignment):
+            kept.append(assignment)
+        else:
+            removed.append(assignment)
+            affected.add(assignment[0])
+
+    load = [plan.load.get(t, 0) for t in teachers]
+    for _, _, _, substitute in removed:
+        k = day_tt.index.get(substitute)
+        if k is not None and load[k]:
+            load[k] -= 1
+
+    added = []
+    uncovered = [u for u in plan.uncovered if u[0] not in affected]
+    for i in sorted(affected):
+        covered = {a[1] for a in kept if a[0] == i}
+        busy = day_tt.mask_of(a[3] for a in kept if a[0] == i)
+        classes = [(j, _covers(day_tt, j, i)) for j in iter_bits(absent_mask) if teachers[j] not in covered]
+        classes = [(j, code) for j, code in classes if code]
+        if not classes:
+            continue
+        free = list(iter_bits(day_tt.free_masks[i] & ~absent_mask & ~busy))
+        matched = set()
+        if free:
+            for c, k in _match_period(classes, free, load):
+                j, code = classes[c]
+                load[k] += 1
+                matched.add(c)
+                added.append((i, teachers[j], names[code], teachers[k]))
+        uncovered.extend(
+            (i, teachers[j], names[code])
+            for c, (j, code) in enumerate(classes)
+            if c not in matched
+        )
+
+    assignments = sorted(kept + added, key=lambda a: a[0])
+    result = day_tt.copy()
+    for i, _, period, substitute in assignments:
+        result.set_cell(day_tt.index[substitute], i, period)
+    uncovered.sort(key=lambda u: u[0])
+
+    new_plan = SubstitutionPlan(
+        day_tt.day, result.as_dict(absent_mask), assignments, uncovered, dict(zip(teachers, load)), absentees
+    )
+    return new_plan, PlanDiff(added, removed)
+
+
+def plan_day(day, absentees, db_path=DB_PATH, load=None, progress=None):
+    # progress(done, total) is called once per period; it may raise to abort
+    day_tt = load_day(day, db_path)
+    return balanced_substitute(day_tt, absentees, load, progress)
+
+
+def replan_day(plan, absentees, db_path=DB_PATH):
+    return replan(load_day(plan.day, db_path), plan, absentees)
+
+
+def create_time_table(day, absentees, db_path=DB_PATH, mode=RANDOM, seed=None):
+    # seed makes the random and search modes repeatable
+    if mode == BALANCED:
+        return plan_day(day, absentees, db_path).timetable
+    if mode == SEARCH:
+        import planner  # planner imports this module
+        return planner.search_day(day, absentees, db_path, seed=seed or 0)[0].timetable
+    day_tt = load_day(day, db_path)
+    return substitute(day_tt, absentees, random if seed is None else random.Random(seed))
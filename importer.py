@@ -0,0 +1,118 @@
+import csv
+import os
+import sys
+
+import engine
+import integrity
+from database import get_db, PERIOD_COLUMNS
+
+# Bulk import of a master timetable from CSV or XLSX. The file needs a
+# header row with Day, Teacher and Period 1..Period 8 columns (any case,
+# "period1" works too). Rows are streamed straight into one executemany;
+# bad rows are reported and skipped instead of aborting the whole file.
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []  # (line number, message)
+        self.issues = []  # integrity.Issue for the imported days
+
+    def summary(self):
+        text = f'{self.inserted} schedules added, {self.updated} updated'
+        if self.errors:
+            text += f', {len(self.errors)} rows skipped'
+        if self.issues:
+            text += f', {len(self.issues)} timetable problems'
+        return text
+
+
+def _column_key(name):
+    return str(name or '').strip().lower().replace(' ', '').replace('_', '')
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.reader(f):
+            yield row
+
+
+def read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError('Importing .xlsx files needs openpyxl (pip install openpyxl)')
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if cell is None else str(cell) for cell in row]
+    finally:
+        workbook.close()
+
+
+def read_rows(path):
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+        return read_xlsx(path)
+    return read_csv(path)
+
+
+def validate(rows, result):
+    # Yields (day, teacher, *periods) for good rows and records the rest
+    header = None
+    days = {day.lower(): day for day in DAYS}
+    for line, row in enumerate(rows, 1):
+        if not any(str(cell).strip() for cell in row):
+            continue
+        if header is None:
+            keys = [_column_key(cell) for cell in row]
+            wanted = ['day', 'teacher'] + PERIOD_COLUMNS
+            missing = [name for name in wanted if name not in keys]
+            if missing:
+                raise ValueError(f'Line {line}: missing columns: {", ".join(missing)}')
+            header = [keys.index(name) for name in wanted]
+            continue
+
+        cells = [str(row[i]).strip() if i < len(row) else '' for i in header]
+        day = days.get(cells[0].lower())
+        if day is None:
+            result.errors.append((line, f'unknown day "{cells[0]}"'))
+        elif not cells[1]:
+            result.errors.append((line, 'teacher name is empty'))
+        elif not all(cells[2:]):
+            empty = [str(i + 1) for i, cell in enumerate(cells[2:]) if not cell]
+            result.errors.append((line, f'empty period {", ".join(empty)}'))
+        else:
+            yield (day, cells[1], *cells[2:])
+
+
+def import_timetable(path, db=None):
+    db = db or get_db()
+    result = ImportResult()
+    days = set()
+
+    def note_days(records):
+        # Remembers the imported days without a second pass over the file
+        for record in records:
+            days.add(record[0])
+            yield record
+
+    result.inserted, result.updated = db.upsert_schedules(note_days(validate(read_rows(path), result)))
+    if days:
+        result.issues = integrity.check_week(engine.WeekTimetable(db.rows_for_days(days)))
+    return result
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('Usage: python importer.py <timetable.csv|timetable.xlsx>')
+        sys.exit(2)
+    get_db().migrate()
+    result = import_timetable(sys.argv[1])
+    for line, message in result.errors:
+        print(f'Line {line}: {message}')
+    for issue in result.issues:
+        print(issue)
+    print(result.summary())
@@ -0,0 +1,248 @@
+import re
+import threading
+from collections import Counter
+
+import engine
+import metrics
+from database import DB_PATH, WORKDAYS, get_db
+
+# Consistency checks over whole days of the timetable. Each check groups
+# the interned subject codes of a DayTimetable (one Counter per period
+# column, bit masks for free periods) instead of comparing rows pairwise,
+# so a 5,000-row week is checked in a few milliseconds. The schedule
+# manager runs them on every save and the planners on every plan.
+#
+# A slot's class is the last word of its text when that looks like a
+# class ("MATH 10A" -> "10A", "9B" -> "9B"). Slots naming only a subject
+# ("Math") have no class and are never double-booked. Two teachers with
+# the same class in the same period are double-booked.
+
+DOUBLE_BOOKED = 'double-booked'
+NO_FREE_PERIOD = 'no free period'
+OVERLOADED = 'overloaded'
+SPELLING = 'free spelling'
+
+# Substitutions one teacher can take in a day before it counts as overload
+MAX_COVER = 2
+
+# Year number and form letter(s), e.g. 9B or 10AB
+CLASS_TOKEN = re.compile(r'\d{1,2}[A-Z]{1,2}')
+
+
+class Issue:
+    """One problem found by a check. period is 0-based, or None for the whole day."""
+
+    __slots__ = ('kind', 'day', 'period', 'teachers', 'detail')
+
+    def __init__(self, kind, day, period, teachers, detail):
+        self.kind = kind
+        self.day = day
+        self.period = period
+        self.teachers = tuple(teachers)
+        self.detail = detail
+
+    def __str__(self):
+        where = self.day if self.period is None else f'{self.day} period {self.period + 1}'
+        return f'{where}: {self.detail}'
+
+    def __repr__(self):
+        return f'Issue({self.kind!r}, {str(self)!r})'
+
+
+def class_of(name):
+    # None for free slots and slots without a class
+    if engine.is_free(name):
+        return None
+    words = name.upper().split()
+    if words and CLASS_TOKEN.fullmatch(words[-1]):
+        return words[-1]
+    return None
+
+
+class ClassKeys:
+    """Class of every subject code as a small int (0 = no class).
+
+    Subject tables only ever grow, so update() only looks at codes added
+    since the last call.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.labels = [None]
+        self.ids = {}
+
+    def update(self, subjects):
+        for name in subjects.names[len(self.keys):]:
+            label = class_of(name)
+            if label is None:
+                self.keys.append(0)
+                continue
+            key = self.ids.get(label)
+            if key is None:
+                key = self.ids[label] = len(self.labels)
+                self.labels.append(label)
+            self.keys.append(key)
+        return self
+
+
+_shared_keys = ClassKeys()
+_keys_lock = threading.Lock()
+
+
+def class_keys(subjects):
+    if subjects is not engine.SUBJECTS:
+        return ClassKeys().update(subjects)
+    with _keys_lock:
+        return _shared_keys.update(subjects)
+
+
+def _double_booked(day_tt, classes):
+    lookup = classes.keys.__getitem__
+    issues = []
+    cells = day_tt.cells
+    for i in range(engine.PERIOD_COUNT):
+        column = list(map(lookup, cells[i::engine.PERIOD_COUNT]))
+        # All in C: a clash-free period has as many distinct classes as taught slots
+        distinct = set(column)
+        distinct.discard(0)
+        if len(distinct) == len(column) - column.count(0):
+            continue
+        clashing = {key for key, n in Counter(column).items() if n > 1 and key}
+        teachers = {}
+        for j, key in enumerate(column):
+            if key in clashing:
+                teachers.setdefault(key, []).append(day_tt.teachers[j])
+        for key, who in teachers.items():
+            issues.append(Issue(
+                DOUBLE_BOOKED, day_tt.day, i, who, f'class {classes.labels[key]} is taught by {", ".join(who)}'
+            ))
+    return issues
+
+
+def _without_free_period(day_tt):
+    any_free = 0
+    for mask in day_tt.free_masks:
+        any_free |= mask
+    busy = ((1 << len(day_tt)) - 1) & ~any_free
+    return [day_tt.teachers[j] for j in engine.iter_bits(busy)]
+
+
+def _spellings(day_tt):
+    # Free slots not written as FREE. Empty (NULL) slots are left alone.
+    # None is what older versions seeded new teachers with, so it is
+    # reported as a legacy placeholder rather than a misspelling.
+    names = day_tt.subjects.names
+    free = day_tt.subjects.free
+    odd = {
+        code for code in set(day_tt.cells)
+        if free[code] and names[code] is not None and names[code] != 'FREE'
+    }
+    if not odd:
+        return []
+    teachers = {}
+    for p, code in enumerate(day_tt.cells):
+        if code in odd:
+            teachers.setdefault(code, []).append(day_tt.teachers[p // engine.PERIOD_COUNT])
+    issues = []
+    for code, who in teachers.items():
+        if names[code].strip(' ').upper() == 'NONE':
+            detail = f'legacy None placeholder {names[code]!r} instead of FREE ({len(who)})'
+        else:
+            detail = f'free periods written as {names[code]!r} instead of FREE ({len(who)})'
+        issues.append(Issue(SPELLING, day_tt.day, None, sorted(set(who)), detail))
+    return issues
+
+
+@metrics.timed('integrity.check_day', rows=len)
+def check_day(day_tt, classes=None):
+    if classes is None:
+        classes = class_keys(day_tt.subjects)
+    issues = _double_booked(day_tt, classes)
+    issues += [
+        Issue(NO_FREE_PERIOD, day_tt.day, None, [teacher], f'{teacher} has no free period')
+        for teacher in _without_free_period(day_tt)
+    ]
+    issues += _spellings(day_tt)
+    return issues
+
+
+@metrics.timed('integrity.check_week', rows=len)
+def check_week(week):
+    # Days share one SubjectTable, so the class of each code is worked out once
+    classes = class_keys(week.subjects)
+    issues = []
+    for day_tt in week:
+        issues += check_day(day_tt, classes)
+    return issues
+
+
+def check_timetable(days=WORKDAYS, db_path=DB_PATH):
+    return check_week(engine.WeekTimetable(get_db(db_path).rows_for_days(days)))
+
+
+def check_schedule(day, teacher, periods, id_=None, db_path=DB_PATH):
+    # Checks one schedule before it is saved: the day as it would be with
+    # the row added (or row id_ replaced). Only issues involving the
+    # teacher are returned, plus any spelling problems in the row itself.
+    rows = [row for row in get_db(db_path).rows_for_day(day) if row[0] != id_ and row[2] != teacher]
+    rows.append((id_, day, teacher, *periods))
+    day_tt = engine.DayTimetable(day, rows)
+    return [issue for issue in check_day(day_tt) if teacher in issue.teachers]
+
+
+def check_edits(edits, days, db_path=DB_PATH):
+    # Checks a batch of (schedule_id, period, subject) cell edits before it
+    # is saved: `days` as they would be with every edit made. Only issues
+    # involving an edited teacher are returned.
+    changes = {}
+    for id_, period, subject in edits:
+        changes.setdefault(id_, {})[period] = subject
+    rows = []
+    teachers = set()
+    for row in get_db(db_path).rows_for_days(days):
+        if row[0] in changes:
+            row = list(row)
+            for period, subject in changes[row[0]].items():
+                row[2 + period] = subject
+            teachers.add(row[2])
+        rows.append(tuple(row))
+    return [issue for issue in check_week(engine.WeekTimetable(rows)) if teachers.intersection(issue.teachers)]
+
+
+@metrics.timed('integrity.check_plan', rows=len)
+def check_plan(plan, max_cover=MAX_COVER):
+    # Checks the timetable a plan hands out. Absentees are not in it, so a
+    # double-booking means the cover clashes with another class. A
+    # substitute who covers two classes in one period, more than max_cover
+    # classes in the day or is left with no free period is overloaded.
+    day_tt = engine.DayTimetable(plan.day, [(None, plan.day, t, *p) for t, p in plan.timetable.items()])
+    covers = Counter(substitute for _, _, _, substitute in plan.assignments)
+    issues = [issue for issue in check_day(day_tt) if issue.kind != NO_FREE_PERIOD or issue.teachers[0] not in covers]
+
+    for (i, substitute), n in Counter((i, s) for i, _, _, s in plan.assignments).items():
+        if n > 1:
+            issues.append(Issue(OVERLOADED, plan.day, i, [substitute], f'{substitute} covers {n} classes at once'))
+    no_free = set(_without_free_period(day_tt))
+    for substitute, n in sorted(covers.items()):
+        if n > max_cover:
+            issues.append(Issue(OVERLOADED, plan.day, None, [substitute], f'{substitute} covers {n} classes'))
+        elif substitute in no_free:
+            issues.append(Issue(
+                OVERLOADED, plan.day, None, [substitute], f'{substitute} is left with no free period'
+            ))
+    return issues
+
+
+def summary(issues, limit=20):
+    lines = [str(issue) for issue in issues[:limit]]
+    if len(issues) > limit:
+        lines.append(f'... and {len(issues) - limit} more')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import sys
+    found = check_timetable(db_path=sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
+    for issue in found:
+        print(issue)
+    print(f'{len(found)} problems found')
@@ -1,61 +1,90 @@
 import sys
-import sqlite3
-import random
-import os
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QCheckBox, QPushButton, QTableWidget, QTableWidgetItem, QMessageBox,
-    QScrollArea, QFormLayout, QComboBox, QFileDialog
+    QApplication, QWidget, QVBoxLayout, QPushButton, QTableView, QMessageBox,
+    QListView, QLineEdit, QComboBox, QFileDialog, QProgressBar, QHBoxLayout, QInputDialog, QLabel
 )
 from PyQt5.QtGui import QColor, QPalette, QFont
-from PyQt5.QtCore import Qt, QTimer
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
+from PyQt5.QtCore import Qt, QSortFilterProxyModel
 from teacher_manager import TeacherManager
 from schedule_manager import ScheduleManager
+import engine
+import integrity
+import metrics
+import plan_cache
+import planner
+import range_planner
+from range_dialog import DateRangeDialog
+from coverage_dialog import CoverageDialog
+from data_watcher import watcher
+from debug_panel import DebugPanel
+from models import TimetableModel, PagedModel, AbsenteeModel
+from database import get_db
+from tasks import runner
 
 def create_database():
-    # Connect to SQLite database (it will be created if it does not exist)
-    conn = sqlite3.connect('new_timetable.db')
-    c = conn.cursor()
-
-    # Drop the timetable table if it exists (for a clean slate)
-    c.execute('DROP TABLE IF EXISTS timetable')
-
-    # Create the timetable table
-    c.execute('''
-    CREATE TABLE timetable (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        day TEXT NOT NULL,
-        teacher TEXT NOT NULL,
-        period1 TEXT,
-        period2 TEXT,
-        period3 TEXT,
-        period4 TEXT,
-        period5 TEXT,
-        period6 TEXT,
-        period7 TEXT,
-        period8 TEXT
-    )
-    ''')
-
-    # Commit changes and close the connection
-    conn.commit()
-    conn.close()
-
-if not os.path.exists("new_timetable.db"):
-    create_database()
-    print("Database created as new_timetable.db")
-    
+    # Creates the database, or upgrades an existing one in place
+    if not get_db().exists():
+        print("Database created as new_timetable.db")
+    get_db().migrate()
+
+# Background jobs; each runs on a worker thread as fn(task, *args)
+
+def load_teachers(task):
+    return get_db().teachers()
+
+def fetch_page(task, query, after, limit):
+    return get_db().schedule_page(after=after, limit=limit, **query)
+
+def run_search(task, text):
+    return get_db().search(text)
+
+def plan_substitutions(task, day, absentees, committed, search):
+    # Returns the plan, what changed since the committed one and which
+    # planner made it. A search always plans the whole day afresh.
+    diff = None
+    if search:
+        version = get_db().data_version()
+        plan, _ = planner.search_day(day, absentees, progress=task.report)
+        plan_cache.cache().store(plan, version, mode=plan_cache.SEARCH)
+        how = 'Best plan found by search'
+    elif committed is not None and committed.day == day and set(committed.absentees) != set(absentees):
+        # A change to the absentees of the plan already handed out only
+        # re-plans the periods it touches, so existing cover stays put
+        plan, diff = plan_cache.cached_replan(committed, absentees)
+        how = 'Plan handed out updated for the new absentees'
+    else:
+        # Repeat requests for the same absentees are answered from the cache
+        plan = plan_cache.cached_plan(day, absentees, progress=task.report)
+        how = 'Balanced plan'
+    # Clashes and overloaded substitutes are reported before the plan is shown
+    return plan, diff, integrity.check_plan(plan), how
+
+def plan_date_range(task, first, last, absences):
+    return range_planner.plan_range(first, last, absences, progress=task.report)
+
+def build_timetable_pdf(task, file_name, headers, rows, absentee_names, query=None):
+    import pdf_export  # ReportLab is only loaded once a PDF is wanted
+    if query is not None:
+        # The whole day in the grid's order, not just the pages loaded so far
+        rows = [[str(col_data) for col_data in row] for row in get_db().schedule_page(limit=-1, **query)]
+    task.check()
+    pdf_export.write_day_sheet(file_name, headers, rows, absentee_names)
+
+def export_batch(task, days, absentees, target, combined):
+    import pdf_export
+    return pdf_export.export_days(days, absentees, target, combined=combined, progress=task.report)
+
 class TimeTableManager(QWidget):
     def __init__(self):
         super().__init__()
-        self.checkboxes = {}
+        self.absentee_model = AbsenteeModel()
         self.teacher_manager = None  # Initialize teacher_manager
         self.schedule_manager = None  # Initialize schedule_manager
+        self.debug_panel = None
+        self.coverage_dialog = None
+        self.plan = None  # Last plan shown, updated incrementally after that
         self.init_ui()
-        self.setup_timer()  # Setup the timer for automatic updates
+        watcher().changed.connect(self.update_table)  # Refresh only when the data changes
 
     def init_ui(self):
         self.setWindowTitle('Timetable Manager')
@@ -79,11 +108,23 @@ class TimeTableManager(QWidget):
         self.day_combo_box.currentIndexChanged.connect(self.update_table)
         self.day_combo_box.setStyleSheet("font-size: 16px;")
 
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.checkbox_widget = QWidget()
-        self.scroll_area.setWidget(self.checkbox_widget)
-        self.checkbox_layout = QFormLayout(self.checkbox_widget)
+        # Absentee picker: only visible rows are drawn, typing filters the list
+        self.absentee_filter = QLineEdit()
+        self.absentee_filter.setPlaceholderText('Filter teachers...')
+        self.absentee_filter.setStyleSheet("font-size: 16px;")
+        self.absentee_proxy = QSortFilterProxyModel()
+        self.absentee_proxy.setSourceModel(self.absentee_model)
+        self.absentee_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.absentee_filter.textChanged.connect(self.absentee_proxy.setFilterFixedString)
+        self.absentee_list = QListView()
+        self.absentee_list.setModel(self.absentee_proxy)
+        self.absentee_list.setUniformItemSizes(True)
+        self.absentee_list.setStyleSheet("font-size: 16px;")
+
+        # Balanced is instant; the search tries many plans for half a second
+        self.planner_combo_box = QComboBox()
+        self.planner_combo_box.addItems(['Balanced plan', 'Best plan (search)'])
+        self.planner_combo_box.setStyleSheet("font-size: 16px;")
 
         self.process_button = QPushButton('Process Substitutions')
         self.process_button.clicked.connect(self.process_substitutions)
@@ -101,6 +142,38 @@ class TimeTableManager(QWidget):
             }
         """)
 
+        self.range_button = QPushButton('Plan Date Range')
+        self.range_button.clicked.connect(self.plan_date_range)
+        self.range_button.setStyleSheet("""
+            QPushButton {
+                background-color: #0288d1;
+                color: #ffffff;
+                padding: 10px 20px;
+                font-size: 16px;
+                border: none;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #0277bd;
+            }
+        """)
+
+        self.coverage_button = QPushButton('Coverage What-If')
+        self.coverage_button.clicked.connect(self.open_coverage_dialog)
+        self.coverage_button.setStyleSheet("""
+            QPushButton {
+                background-color: #0288d1;
+                color: #ffffff;
+                padding: 10px 20px;
+                font-size: 16px;
+                border: none;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #0277bd;
+            }
+        """)
+
         self.save_pdf_button = QPushButton('Save as PDF')
         self.save_pdf_button.clicked.connect(self.save_timetable_as_pdf)
         self.save_pdf_button.setStyleSheet("""
@@ -117,6 +190,22 @@ class TimeTableManager(QWidget):
             }
         """)
 
+        self.batch_export_button = QPushButton('Export Day Sheets and Slips')
+        self.batch_export_button.clicked.connect(self.export_day_sheets_and_slips)
+        self.batch_export_button.setStyleSheet("""
+            QPushButton {
+                background-color: #0288d1;
+                color: #ffffff;
+                padding: 10px 20px;
+                font-size: 16px;
+                border: none;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #0277bd;
+            }
+        """)
+
         self.open_schedule_manager_button = QPushButton('Open Schedule Manager')
         self.open_schedule_manager_button.clicked.connect(self.open_schedule_manager)
         self.open_schedule_manager_button.setStyleSheet("""
@@ -149,15 +238,32 @@ class TimeTableManager(QWidget):
             }
         """)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(11)
-        self.table.setHorizontalHeaderLabels([
-            'ID', 'Day', 'Teacher', 'Period 1', 'Period 2', 'Period 3', 'Period 4',
-            'Period 5', 'Period 6', 'Period 7', 'Period 8'
-        ])
+        # Only offered when metrics are switched on (--metrics or TIMETABLE_METRICS=1)
+        self.open_debug_panel_button = QPushButton('Debug Metrics')
+        self.open_debug_panel_button.clicked.connect(self.open_debug_panel)
+        self.open_debug_panel_button.setVisible(metrics.enabled())
+
+        # Week-wide search over teachers, classes and days; each keystroke
+        # is one lookup in the search index and supersedes the last
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText('Search the week, e.g. "9B thursday" or a teacher...')
+        self.search_box.setStyleSheet("font-size: 16px;")
+        self.search_box.textChanged.connect(self.search_week)
+        self.search_model = TimetableModel(headers=['Day', 'Period', 'Teacher', 'Class'], key=lambda row: row[4])
+        self.search_results = QTableView()
+        self.search_results.setModel(self.search_model)
+        self.search_results.clicked.connect(self.show_search_day)
+        self.search_results.hide()
+
+        # Fetched a page at a time as the grid scrolls
+        self.model = PagedModel(fetch_page)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
 
         self.table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #e0f2f1;
                 gridline-color: #004d40;
             }
@@ -166,7 +272,7 @@ class TimeTableManager(QWidget):
                 color: #ffffff;
                 font-size: 16px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 10px;
                 border: 1px solid #004d40;
                 font-size: 14px;
@@ -174,182 +280,231 @@ class TimeTableManager(QWidget):
         """)
         self.table.setFont(QFont('Arial', 12))
 
+        # Progress of a running substitution plan, hidden while idle
+        self.progress_bar = QProgressBar()
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.clicked.connect(self.cancel_substitutions)
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+        self.progress_widget = QWidget()
+        self.progress_widget.setLayout(progress_layout)
+        self.progress_widget.hide()
+
+        # Which planner made the plan in the grid
+        self.plan_label = QLabel()
+        self.plan_label.setStyleSheet("font-size: 14px;")
+        self.plan_label.hide()
+
         main_layout.addWidget(self.day_combo_box)
-        main_layout.addWidget(self.scroll_area)
+        main_layout.addWidget(self.absentee_filter)
+        main_layout.addWidget(self.absentee_list)
+        main_layout.addWidget(self.planner_combo_box)
         main_layout.addWidget(self.process_button)
+        main_layout.addWidget(self.range_button)
+        main_layout.addWidget(self.coverage_button)
+        main_layout.addWidget(self.progress_widget)
+        main_layout.addWidget(self.plan_label)
         main_layout.addWidget(self.save_pdf_button)
+        main_layout.addWidget(self.batch_export_button)
         main_layout.addWidget(self.open_schedule_manager_button)
         main_layout.addWidget(self.open_teacher_manager_button)
+        main_layout.addWidget(self.open_debug_panel_button)
+        main_layout.addWidget(self.search_box)
+        main_layout.addWidget(self.search_results)
         main_layout.addWidget(self.table)
 
         self.setLayout(main_layout)
 
         self.update_table()
 
-    def setup_timer(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_table)
-        self.timer.start(1000)  # Update every 1000 milliseconds (1 seconds)
-
-    def load_absentees(self):
-        if not os.path.exists('new_timetable.db'):
+    def update_table(self):
+        day = self.day_combo_box.currentText()
+        if not get_db().exists():
             QMessageBox.critical(self, 'Error', 'Database file not found!')
             return
 
-        conn = sqlite3.connect('new_timetable.db')
-        c = conn.cursor()
-        c.execute('SELECT DISTINCT teacher FROM timetable')
-        rows = c.fetchall()
-        conn.close()
+        # A newer request (day switch, data change) supersedes this one
+        runner().submit(('teachers', id(self)), load_teachers, on_result=self.show_teachers)
+        self.search_week(self.search_box.text())
+        # A data change reloads the pages already shown; a new day starts over
+        if self.model.query is not None and self.model.query['day'] == day:
+            self.model.refresh()
+            return
+        header = self.table.horizontalHeader()
+        self.model.set_query({
+            'day': day, 'sort': header.sortIndicatorSection(),
+            'descending': header.sortIndicatorOrder() == Qt.DescendingOrder,
+        })
+
+    def show_teachers(self, teachers):
+        # Only added or removed teachers touch the list; checks are kept
+        self.absentee_model.set_teachers(teachers)
+
+    def search_week(self, text):
+        if not text.strip():
+            runner().cancel(('search', id(self)))
+            self.search_model.set_rows([])
+            self.search_results.hide()
+            return
+        runner().submit(('search', id(self)), run_search, text, on_result=self.show_search_results)
 
-        checked_states = {teacher: checkbox.isChecked() for teacher, checkbox in self.checkboxes.items() if checkbox}
+    def show_search_results(self, rows):
+        self.search_model.set_rows(rows)
+        self.search_results.show()
 
-        for i in reversed(range(self.checkbox_layout.count())):
-            widget = self.checkbox_layout.itemAt(i).widget()
-            if widget:
-                widget.deleteLater()
+    def show_search_day(self, index):
+        # Jump the grid to the day of the clicked slot
+        self.day_combo_box.setCurrentText(self.search_model.row(index.row())[0])
 
-        self.checkboxes = {}
-        for row in rows:
-            teacher_name = row[0]
-            checkbox = QCheckBox(teacher_name)
-            checkbox.setStyleSheet("font-size: 16px;")
-            self.checkbox_layout.addWidget(checkbox)
-            self.checkboxes[teacher_name] = checkbox
+    def process_substitutions(self):
+        day = self.day_combo_box.currentText()
+        absentees = self.absentee_model.checked_teachers()
 
-        for teacher, is_checked in checked_states.items():
-            if teacher in self.checkboxes:
-                self.checkboxes[teacher].setChecked(is_checked)
+        if not absentees:
+            QMessageBox.warning(self, 'Error', 'Please select at least one absentee')
+            return
 
-    def update_table(self):
-        day = self.day_combo_box.currentText()
-        self.load_absentees()
-        if not os.path.exists('new_timetable.db'):
+        if not get_db().exists():
             QMessageBox.critical(self, 'Error', 'Database file not found!')
             return
 
-        conn = sqlite3.connect('new_timetable.db')
-        c = conn.cursor()
-        c.execute('SELECT * FROM timetable WHERE day = ?', (day,))
-        rows = c.fetchall()
-        self.table.setRowCount(len(rows))
-        for row_num, row_data in enumerate(rows):
-            for col_num, col_data in enumerate(row_data):
-                self.table.setItem(row_num, col_num, QTableWidgetItem(str(col_data)))
-        conn.close()
-
-    def process_substitutions(self):
-        print("Process button clicked")
-        day = self.day_combo_box.currentText()
-        absentees = [teacher for teacher, checkbox in self.checkboxes.items() if checkbox.isChecked()]
-        print(f"Selected absentees: {absentees}")
-
+        # Keep a pending refresh from overwriting the result
+        self.model.cancel()
+        self.progress_bar.setValue(0)
+        self.progress_widget.show()
+        runner().submit(
+            ('plan', id(self)), plan_substitutions, day, absentees, self.plan,
+            self.planner_combo_box.currentIndex() == 1,
+            on_result=self.show_plan, on_error=self.plan_failed, on_progress=self.show_progress
+        )
+
+    def show_progress(self, done, total):
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(done)
+
+    def cancel_substitutions(self):
+        runner().cancel(('plan', id(self)))
+        runner().cancel(('batch', id(self)))
+        runner().cancel(('range', id(self)))
+        self.progress_widget.hide()
+
+    def plan_failed(self, e):
+        self.progress_widget.hide()
+        print(f"An error occurred in create_time_table: {e}")
+        QMessageBox.critical(self, 'Error', f'An error occurred: {e}')
+
+    def show_plan(self, result):
+        plan, diff, issues, how = result
+        self.plan = plan
+        self.progress_widget.hide()
+        self.plan_label.setText(f'{plan.day}: {how}')
+        self.plan_label.show()
+        self.display_updated_timetable(plan.timetable)
+
+        # Only the substitutions that changed need to be passed on
+        if diff:
+            lines = [f'Period {i + 1}: {substitute} now covers {period} for {teacher}'
+                     for i, teacher, period, substitute in diff.added]
+            lines += [f'Period {i + 1}: {substitute} no longer covers {period} for {teacher}'
+                      for i, teacher, period, substitute in diff.removed]
+            QMessageBox.information(self, 'Substitutions changed', '\n'.join(lines))
+
+        # Tell the user which classes nobody could cover
+        if plan.uncovered:
+            lines = [f'Period {i + 1}: {period} ({teacher})' for i, teacher, period in plan.uncovered]
+            QMessageBox.warning(self, 'Uncovered periods', 'No free teacher available for:\n' + '\n'.join(lines))
+
+        if issues:
+            QMessageBox.warning(self, 'Timetable problems', integrity.summary(issues))
+
+    def plan_date_range(self):
+        absentees = self.absentee_model.checked_teachers()
         if not absentees:
             QMessageBox.warning(self, 'Error', 'Please select at least one absentee')
             return
 
-        updated_tt = self.create_time_table(day, absentees)
-        print("Updated timetable:", updated_tt)
+        dialog = DateRangeDialog(absentees, self)
+        if dialog.exec_() != DateRangeDialog.Accepted:
+            return
+        first, last = dialog.dateRange()
+        self.progress_bar.setValue(0)
+        self.progress_widget.show()
+        runner().submit(
+            ('range', id(self)), plan_date_range, first, last, dialog.absences(),
+            on_result=self.show_date_range, on_error=self.plan_failed, on_progress=self.show_progress
+        )
+
+    def show_date_range(self, plans):
+        self.progress_widget.hide()
+        if not plans:
+            QMessageBox.information(self, 'Date range', 'No school days with absentees in that range.')
+            return
+        lines = [
+            f'{date.isoformat()} {plan.day}: {len(plan.assignments)} covered, {len(plan.uncovered)} uncovered'
+            for date, plan in plans
+        ]
+        QMessageBox.information(self, 'Date range planned', '\n'.join(lines))
 
-        self.display_updated_timetable(updated_tt)
+    def display_updated_timetable(self, updated_tt):
+        day = self.day_combo_box.currentText()
+        self.model.show_rows(
+            (row_num + 1, day, teacher) + tuple(periods)
+            for row_num, (teacher, periods) in enumerate(updated_tt.items())
+        )
+
+    def save_timetable_as_pdf(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, 'Save PDF', '', 'PDF Files (*.pdf)')
+        if file_name:
+            # Snapshot what is on screen, then render off the GUI thread; a
+            # paged day is read in full there
+            rows = [[str(col_data) for col_data in row] for row in self.model.rows]
+            runner().submit(
+                ('pdf', id(self)), build_timetable_pdf,
+                file_name, self.model.headers, rows, self.absentee_model.checked_teachers(), self.model.query,
+                on_result=lambda _: QMessageBox.information(self, 'Success', 'PDF saved successfully!'),
+                on_error=self.pdf_failed
+            )
+
+    def pdf_failed(self, e):
+        print(f"An error occurred while saving the PDF: {e}")
+        QMessageBox.critical(self, 'Error', f'An error occurred while saving the PDF: {e}')
+
+    def export_day_sheets_and_slips(self):
+        absentees = self.absentee_model.checked_teachers()
+        scope, ok = QInputDialog.getItem(self, 'Export', 'Days to export:', ['Selected day', 'Whole week'], 0, False)
+        if not ok:
+            return
+        if scope == 'Selected day':
+            days = [self.day_combo_box.currentText()]
+        else:
+            days = [self.day_combo_box.itemText(i) for i in range(self.day_combo_box.count())]
+        output, ok = QInputDialog.getItem(self, 'Export', 'Write as:', ['Folder of PDFs', 'One combined PDF'], 0, False)
+        if not ok:
+            return
 
-        self.timer.start(30000)
+        combined = output == 'One combined PDF'
+        if combined:
+            target, _ = QFileDialog.getSaveFileName(self, 'Save PDF', '', 'PDF Files (*.pdf)')
+        else:
+            target = QFileDialog.getExistingDirectory(self, 'Export to folder')
+        if not target:
+            return
 
-    def create_time_table(self, day, absentees):
-        if not os.path.exists('new_timetable.db'):
-            QMessageBox.critical(self, 'Error', 'Database file not found!')
-            return {}
-
-        try:
-            conn = sqlite3.connect('new_timetable.db')
-            c = conn.cursor()
-
-            c.execute('SELECT * FROM timetable WHERE day = ?', (day,))
-            rows = c.fetchall()
-            timetable = {}
-            for row in rows:
-                timetable[row[2]] = row[3:]
-
-            presentees = {teacher for teacher in timetable if teacher not in absentees}
-
-            periods = {i: [] for i in range(8)}
-            for teacher in presentees:
-                for i, period in enumerate(timetable[teacher]):
-                    if period.upper() == 'FREE':
-                        periods[i].append(teacher)
-
-            for teacher in absentees:
-                if teacher in timetable:
-                    for i, period in enumerate(timetable[teacher]):
-                        if period.upper() != 'FREE' and periods[i]:
-                            replacement_teacher = random.choice(periods[i])
-                            timetable[replacement_teacher] = (
-                                timetable[replacement_teacher][:i] + (period,) + timetable[replacement_teacher][i + 1:]
-                            )
-                    del timetable[teacher]
-
-            conn.close()
-            return timetable
-        except Exception as e:
-            print(f"An error occurred in create_time_table: {e}")
-            QMessageBox.critical(self, 'Error', f'An error occurred: {e}')
-            return {}
+        self.progress_bar.setValue(0)
+        self.progress_widget.show()
+        runner().submit(
+            ('batch', id(self)), export_batch, days, absentees, target, combined,
+            on_result=self.batch_exported, on_error=self.batch_failed, on_progress=self.show_progress
+        )
 
-    def display_updated_timetable(self, updated_tt):
-        self.table.setRowCount(len(updated_tt))
-        row_num = 0
-        for teacher, periods in updated_tt.items():
-            row_data = [row_num + 1, self.day_combo_box.currentText(), teacher] + list(periods)
-            for col_num, col_data in enumerate(row_data):
-                self.table.setItem(row_num, col_num, QTableWidgetItem(str(col_data)))
-            row_num += 1
+    def batch_exported(self, paths):
+        self.progress_widget.hide()
+        QMessageBox.information(self, 'Success', f'{len(paths)} PDF file(s) saved.')
 
-    def save_timetable_as_pdf(self):
-        try:
-            file_name, _ = QFileDialog.getSaveFileName(self, 'Save PDF', '', 'PDF Files (*.pdf)')
-            if file_name:
-                doc = SimpleDocTemplate(file_name, pagesize=letter)
-                elements = []
-
-                stylesheet = getSampleStyleSheet()
-
-                # Add absentee names at the top
-                absentee_names = [teacher for teacher, checkbox in self.checkboxes.items() if checkbox.isChecked()]
-                absentee_text = 'Absentees: ' + ', '.join(absentee_names) if absentee_names else 'No absentees'
-                absentee_paragraph = Paragraph(absentee_text, stylesheet['Normal'])
-                elements.append(absentee_paragraph)
-                elements.append(Spacer(1, 12))
-
-                # Change title
-                title = Paragraph('Today\'s Timetable', stylesheet['Title'])
-                elements.append(title)
-                elements.append(Spacer(1, 12))
-
-                # Add table
-                table_data = []
-                headers = [self.table.horizontalHeaderItem(i).text() for i in range(self.table.columnCount())]
-                table_data.append(headers)
-                for row in range(self.table.rowCount()):
-                    row_data = [self.table.item(row, col).text() if self.table.item(row, col) else '' for col in
-                                range(self.table.columnCount())]
-                    table_data.append(row_data)
-
-                table = Table(table_data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                elements.append(table)
-                doc.build(elements)
-                QMessageBox.information(self, 'Success', 'PDF saved successfully!')
-        except Exception as e:
-            print(f"An error occurred while saving the PDF: {e}")
-            QMessageBox.critical(self, 'Error', f'An error occurred while saving the PDF: {e}')
+    def batch_failed(self, e):
+        self.progress_widget.hide()
+        self.pdf_failed(e)
 
     def open_schedule_manager(self):
         if self.schedule_manager is None:
@@ -361,9 +516,21 @@ class TimeTableManager(QWidget):
             self.teacher_manager = TeacherManager()
         self.teacher_manager.show()
 
+    def open_coverage_dialog(self):
+        if self.coverage_dialog is None:
+            self.coverage_dialog = CoverageDialog(self)
+        self.coverage_dialog.show()
+
+    def open_debug_panel(self):
+        if self.debug_panel is None:
+            self.debug_panel = DebugPanel()
+        self.debug_panel.show()
+
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    # --metrics, --profile NAME, --metrics-out FILE, --trace-out FILE
+    app = QApplication(metrics.configure(sys.argv))
+    create_database()
     main_win = TimeTableManager()
     main_win.show()
     sys.exit(app.exec_())
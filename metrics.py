@@ -0,0 +1,179 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Opt-in instrumentation for the hot paths. Timed operations record wall
+# time, call counts and row counts in an in-process registry that the
+# debug panel shows and that can be dumped as JSON or as a Chrome trace
+# (load it in chrome://tracing or https://ui.perfetto.dev).
+#
+# Off by default; switch on with TIMETABLE_METRICS=1 or --metrics. Set
+# TIMETABLE_PROFILE=<operation> or --profile <operation> to run every call
+# of that operation under cProfile; each call writes <operation>-N.prof and
+# prints the top functions. --metrics-out and --trace-out write the JSON
+# and the trace when the app exits.
+
+TRACE_EVENTS = 20000
+
+_enabled = os.environ.get('TIMETABLE_METRICS', '') not in ('', '0')
+_profile = os.environ.get('TIMETABLE_PROFILE') or None
+_lock = threading.Lock()
+_stats = {}
+_events = deque(maxlen=TRACE_EVENTS)
+_epoch = time.perf_counter()
+_profiling = threading.Lock()
+_profiles = 0
+
+
+class Stat:
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total * 1000 / self.calls if self.calls else 0.0,
+            'max_ms': self.max * 1000,
+            'rows': self.rows,
+        }
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def profile(operation):
+    # Profile every call of operation from now on; None switches it off
+    global _profile
+    _profile = operation
+    if operation:
+        enable()
+
+
+def record(name, seconds, rows=None, start=None):
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = Stat()
+        stat.calls += 1
+        stat.total += seconds
+        stat.max = max(stat.max, seconds)
+        if rows:
+            stat.rows += rows
+        if start is not None:
+            _events.append((name, start - _epoch, seconds, threading.get_ident(), rows))
+
+
+def count(name, rows=None):
+    # A call with no duration, e.g. a cache hit
+    if _enabled:
+        record(name, 0.0, rows)
+
+
+def _run_profiled(name, fn, args, kwargs):
+    global _profiles
+    # cProfile can only profile one thing at a time
+    if not _profiling.acquire(blocking=False):
+        return fn(*args, **kwargs)
+    import cProfile
+    import pstats
+    try:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn, *args, **kwargs)
+        _profiles += 1
+        file_name = f'{name}-{_profiles}.prof'
+        profiler.dump_stats(file_name)
+        print(f'Profile of {name} written to {file_name}')
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+        return result
+    finally:
+        _profiling.release()
+
+
+def timed(name, rows=None):
+    # Decorator; rows(result) gives the row count to record, if any
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            if _profile == name:
+                result = _run_profiled(name, fn, args, kwargs)
+            else:
+                result = fn(*args, **kwargs)
+            record(name, time.perf_counter() - start, rows(result) if rows else None, start)
+            return result
+        return wrapper
+    return decorate
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _events.clear()
+
+
+def snapshot():
+    with _lock:
+        return {name: stat.as_dict() for name, stat in sorted(_stats.items())}
+
+
+def dump_json(file_name):
+    with open(file_name, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+def chrome_trace():
+    with _lock:
+        events = list(_events)
+    return {'traceEvents': [
+        {
+            'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+            'ts': start * 1e6, 'dur': seconds * 1e6, 'args': {'rows': rows} if rows else {},
+        }
+        for name, start, seconds, tid, rows in events
+    ]}
+
+
+def dump_chrome_trace(file_name):
+    with open(file_name, 'w') as f:
+        json.dump(chrome_trace(), f)
+
+
+def configure(argv):
+    # Handles --metrics, --profile NAME, --metrics-out FILE and --trace-out
+    # FILE; returns the remaining arguments
+    dumps = {'--metrics-out': dump_json, '--trace-out': dump_chrome_trace}
+    rest = []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--metrics':
+            enable()
+        elif arg == '--profile':
+            profile(next(args, None))
+        elif arg in dumps:
+            file_name = next(args, None)
+            if file_name:
+                enable()
+                atexit.register(dumps[arg], file_name)
+        else:
+            rest.append(arg)
+    return rest
+
+
+if _profile:
+    _enabled = True
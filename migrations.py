@@ -0,0 +1,429 @@
+# Versioned schema migrations. The applied version is kept in
+# PRAGMA user_version and every step runs in its own transaction, so an
+# existing database is upgraded in place and a failed step leaves it
+# untouched.
+
+PERIODS = range(1, 9)
+
+# How a slot's text maps to the is_free flag. Each rule is frozen with the
+# step that introduced it, so a step does the same thing whichever build
+# runs it.
+#
+# Up to version 4 only spellings of FREE were free.
+NORMALIZE_IS_FREE_SQL = "coalesce(upper({0}) = 'FREE', 0)"
+# From version 5 NULL, blank and 'None' (what new teachers used to be
+# seeded with) count as free too.
+FREE_SLOTS_IS_FREE_SQL = "coalesce(upper(trim({0})) IN ('FREE', 'NONE', ''), 1)"
+# The current rule, for code writing slots; must agree with engine.is_free
+IS_FREE_SQL = FREE_SLOTS_IS_FREE_SQL
+
+
+def _legacy_table():
+    return ['''
+    CREATE TABLE IF NOT EXISTS timetable (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        day TEXT NOT NULL,
+        teacher TEXT NOT NULL,
+        period1 TEXT,
+        period2 TEXT,
+        period3 TEXT,
+        period4 TEXT,
+        period5 TEXT,
+        period6 TEXT,
+        period7 TEXT,
+        period8 TEXT
+    )
+    ''']
+
+
+PERIOD_NUMBERS = ' UNION ALL '.join(f'SELECT {p} AS period' for p in PERIODS)
+
+
+def subject_of(prefix):
+    # Picks {prefix}periodN for the period number p.period
+    return 'CASE p.period ' + ' '.join(f'WHEN {p} THEN {prefix}period{p}' for p in PERIODS) + ' END'
+
+
+def _timetable_write_triggers(is_free_sql):
+    # Shared by _normalize and _free_slots, which recreates them with its
+    # own rule for is_free
+    subject_case = ' '.join(f'WHEN {p} THEN NEW.period{p}' for p in PERIODS)
+    return [
+        f'''
+        CREATE TRIGGER timetable_insert INSTEAD OF INSERT ON timetable
+        BEGIN
+            INSERT OR IGNORE INTO days (name) VALUES (NEW.day);
+            INSERT OR IGNORE INTO teachers (name) VALUES (NEW.teacher);
+            INSERT INTO schedules (id, day_id, teacher_id) VALUES (
+                NEW.id,
+                (SELECT id FROM days WHERE name = NEW.day),
+                (SELECT id FROM teachers WHERE name = NEW.teacher)
+            );
+            INSERT INTO slots (schedule_id, day_id, teacher_id, period, subject, is_free)
+            SELECT s.id, s.day_id, s.teacher_id, p.period, {subject_of('NEW.')},
+                {is_free_sql.format(subject_of('NEW.'))}
+            FROM schedules s, ({PERIOD_NUMBERS}) p
+            WHERE s.id = last_insert_rowid();
+        END
+        ''',
+        f'''
+        CREATE TRIGGER timetable_update INSTEAD OF UPDATE ON timetable
+        BEGIN
+            INSERT OR IGNORE INTO days (name) VALUES (NEW.day);
+            INSERT OR IGNORE INTO teachers (name) VALUES (NEW.teacher);
+            UPDATE schedules SET
+                day_id = (SELECT id FROM days WHERE name = NEW.day),
+                teacher_id = (SELECT id FROM teachers WHERE name = NEW.teacher)
+            WHERE id = OLD.id;
+            UPDATE slots SET subject = CASE period {subject_case} END WHERE schedule_id = OLD.id;
+            UPDATE slots SET is_free = {is_free_sql.format('subject')} WHERE schedule_id = OLD.id;
+            DELETE FROM teachers WHERE name = OLD.teacher
+                AND NOT EXISTS (SELECT 1 FROM schedules WHERE teacher_id = teachers.id);
+        END
+        ''',
+    ]
+
+
+def _normalize():
+    is_free_sql = NORMALIZE_IS_FREE_SQL
+    period_columns = ',\n        '.join(
+        f'(SELECT subject FROM slots WHERE schedule_id = s.id AND period = {p}) AS period{p}' for p in PERIODS
+    )
+    return [
+        'CREATE TABLE teachers (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+        'CREATE TABLE days (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)',
+        '''
+        CREATE TABLE schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            day_id INTEGER NOT NULL REFERENCES days(id),
+            teacher_id INTEGER NOT NULL REFERENCES teachers(id)
+        )
+        ''',
+        # day_id and teacher_id are copied onto slots so free-teacher
+        # lookups are answered from one covering index
+        '''
+        CREATE TABLE slots (
+            schedule_id INTEGER NOT NULL REFERENCES schedules(id) ON DELETE CASCADE,
+            day_id INTEGER NOT NULL,
+            teacher_id INTEGER NOT NULL,
+            period INTEGER NOT NULL,
+            subject TEXT,
+            is_free INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (schedule_id, period)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX schedules_day_teacher ON schedules (day_id, teacher_id)',
+        'CREATE INDEX schedules_teacher ON schedules (teacher_id)',
+        'CREATE INDEX slots_day_period_free ON slots (day_id, period, is_free, teacher_id)',
+
+        # Copy the old wide rows across, keeping their ids
+        "INSERT INTO days (name) VALUES ('Monday'), ('Tuesday'), ('Wednesday'), ('Thursday'), ('Friday')",
+        'INSERT OR IGNORE INTO days (name) SELECT DISTINCT day FROM timetable',
+        'INSERT OR IGNORE INTO teachers (name) SELECT DISTINCT teacher FROM timetable',
+        '''
+        INSERT INTO schedules (id, day_id, teacher_id)
+        SELECT tt.id, d.id, t.id FROM timetable tt
+        JOIN days d ON d.name = tt.day
+        JOIN teachers t ON t.name = tt.teacher
+        ''',
+        f'''
+        INSERT INTO slots (schedule_id, day_id, teacher_id, period, subject, is_free)
+        SELECT s.id, s.day_id, s.teacher_id, p.period, {subject_of('tt.')},
+            {is_free_sql.format(subject_of('tt.'))}
+        FROM timetable tt JOIN schedules s ON s.id = tt.id, ({PERIOD_NUMBERS}) p
+        ''',
+        'DROP TABLE timetable',
+
+        # The old wide shape lives on as a view so existing queries keep working
+        f'''
+        CREATE VIEW timetable AS
+        SELECT s.id AS id, d.name AS day, t.name AS teacher,
+        {period_columns}
+        FROM schedules s
+        JOIN days d ON d.id = s.day_id
+        JOIN teachers t ON t.id = s.teacher_id
+        ''',
+        '''
+        CREATE TRIGGER schedules_move AFTER UPDATE OF day_id, teacher_id ON schedules
+        BEGIN
+            UPDATE slots SET day_id = NEW.day_id, teacher_id = NEW.teacher_id WHERE schedule_id = NEW.id;
+        END
+        ''',
+    ] + _timetable_write_triggers(is_free_sql) + [
+        '''
+        CREATE TRIGGER timetable_delete INSTEAD OF DELETE ON timetable
+        BEGIN
+            DELETE FROM slots WHERE schedule_id = OLD.id;
+            DELETE FROM schedules WHERE id = OLD.id;
+            DELETE FROM teachers WHERE name = OLD.teacher
+                AND NOT EXISTS (SELECT 1 FROM schedules WHERE teacher_id = teachers.id);
+        END
+        ''',
+    ]
+
+
+def _change_counter():
+    # PRAGMA data_version only lives as long as a connection, so schedule
+    # changes also bump a persistent counter that cached plans are keyed on
+    bump = 'UPDATE data_changes SET version = version + 1 WHERE id = 1'
+    watched = [
+        ('teachers', 'UPDATE'),
+        ('schedules', 'INSERT'), ('schedules', 'UPDATE'), ('schedules', 'DELETE'),
+        ('slots', 'INSERT'), ('slots', 'UPDATE'), ('slots', 'DELETE'),
+    ]
+    return [
+        'CREATE TABLE data_changes (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)',
+        'INSERT INTO data_changes (id, version) VALUES (1, 0)',
+        '''
+        CREATE TABLE substitution_runs (
+            day TEXT NOT NULL,
+            absentees TEXT NOT NULL,
+            load TEXT NOT NULL,
+            data_version INTEGER NOT NULL,
+            plan TEXT NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (day, absentees, load)
+        )
+        ''',
+        'CREATE INDEX substitution_runs_last_used ON substitution_runs (last_used)',
+    ] + [
+        f'CREATE TRIGGER {table}_{event.lower()}_changes AFTER {event} ON {table} BEGIN {bump}; END'
+        for table, event in watched
+    ]
+
+
+def _date_plans():
+    # One stored plan per calendar date, written by date range runs
+    return ['''
+    CREATE TABLE substitution_dates (
+        date TEXT PRIMARY KEY,
+        day TEXT NOT NULL,
+        absentees TEXT NOT NULL,
+        data_version INTEGER NOT NULL,
+        plan TEXT NOT NULL
+    )
+    ''']
+
+
+def _free_slots():
+    # Free periods get their own table, kept in step with slots by
+    # triggers, so availability is one index range per (day, period).
+    # slots rewritten by INSERT OR REPLACE don't fire delete triggers,
+    # hence the delete at the start of the insert trigger.
+    return [
+        'DROP TRIGGER timetable_insert',
+        'DROP TRIGGER timetable_update',
+    ] + _timetable_write_triggers(FREE_SLOTS_IS_FREE_SQL) + [
+        f'UPDATE slots SET is_free = {FREE_SLOTS_IS_FREE_SQL.format("subject")}',
+        '''
+        CREATE TABLE free_slots (
+            schedule_id INTEGER NOT NULL,
+            period INTEGER NOT NULL,
+            day_id INTEGER NOT NULL,
+            teacher_id INTEGER NOT NULL,
+            PRIMARY KEY (schedule_id, period)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX free_slots_day_period ON free_slots (day_id, period, teacher_id)',
+        # free_slots answers every availability query now
+        'DROP INDEX slots_day_period_free',
+        '''
+        INSERT INTO free_slots (schedule_id, period, day_id, teacher_id)
+        SELECT schedule_id, period, day_id, teacher_id FROM slots WHERE is_free
+        ''',
+        '''
+        CREATE TRIGGER slots_free_insert AFTER INSERT ON slots
+        BEGIN
+            DELETE FROM free_slots WHERE schedule_id = NEW.schedule_id AND period = NEW.period;
+            INSERT INTO free_slots (schedule_id, period, day_id, teacher_id)
+            SELECT NEW.schedule_id, NEW.period, NEW.day_id, NEW.teacher_id WHERE NEW.is_free;
+        END
+        ''',
+        '''
+        CREATE TRIGGER slots_free_update AFTER UPDATE OF is_free, day_id, teacher_id ON slots
+        BEGIN
+            DELETE FROM free_slots WHERE schedule_id = OLD.schedule_id AND period = OLD.period;
+            INSERT INTO free_slots (schedule_id, period, day_id, teacher_id)
+            SELECT NEW.schedule_id, NEW.period, NEW.day_id, NEW.teacher_id WHERE NEW.is_free;
+        END
+        ''',
+        '''
+        CREATE TRIGGER slots_free_delete AFTER DELETE ON slots
+        BEGIN
+            DELETE FROM free_slots WHERE schedule_id = OLD.schedule_id AND period = OLD.period;
+        END
+        ''',
+    ]
+
+
+def _paging_indexes():
+    # Keyset pages of one day in id order, and in the order of any period
+    # column (slots index entries end with schedule_id, the tie-breaker)
+    return [
+        'CREATE INDEX schedules_day ON schedules (day_id)',
+        'CREATE INDEX slots_day_period_subject ON slots (day_id, period, subject)',
+    ]
+
+
+# Slots are keyed in the search index by schedule_id * 16 + period
+SEARCH_ROWID = '{0}schedule_id * 16 + {0}period'
+SEARCH_OPTIONS = "tokenize = 'unicode61', prefix = '1 2 3'"
+
+
+def _search_index():
+    # Full-text indexes for the search boxes: one row per slot with its day,
+    # teacher and class, and one per teacher. Words are matched by prefix
+    # as they are typed; the prefix indexes keep one- to three-letter
+    # prefixes such as "9B" an index lookup. Triggers keep both in step with
+    # every write path, including bulk imports and renames.
+    slot_values = (
+        f'{SEARCH_ROWID.format("NEW.")}, (SELECT name FROM days WHERE id = NEW.day_id), '
+        '(SELECT name FROM teachers WHERE id = NEW.teacher_id), NEW.subject'
+    )
+    return [
+        f'CREATE VIRTUAL TABLE slot_search USING fts5 (day, teacher, subject, {SEARCH_OPTIONS})',
+        f'CREATE VIRTUAL TABLE teacher_search USING fts5 (name, {SEARCH_OPTIONS})',
+        f'''
+        INSERT INTO slot_search (rowid, day, teacher, subject)
+        SELECT {SEARCH_ROWID.format('k.')}, d.name, t.name, k.subject FROM slots k
+        JOIN days d ON d.id = k.day_id
+        JOIN teachers t ON t.id = k.teacher_id
+        ''',
+        'INSERT INTO teacher_search (rowid, name) SELECT id, name FROM teachers',
+        # INSERT OR REPLACE into slots hands its conflict mode on to this
+        # insert, which then replaces the slot's old index entry
+        f'''
+        CREATE TRIGGER slots_search_insert AFTER INSERT ON slots
+        BEGIN
+            INSERT INTO slot_search (rowid, day, teacher, subject) VALUES ({slot_values});
+        END
+        ''',
+        # timetable updates rewrite all eight slots; unchanged ones are skipped
+        f'''
+        CREATE TRIGGER slots_search_update AFTER UPDATE OF subject, day_id, teacher_id ON slots
+        WHEN OLD.subject IS NOT NEW.subject OR OLD.day_id != NEW.day_id OR OLD.teacher_id != NEW.teacher_id
+        BEGIN
+            DELETE FROM slot_search WHERE rowid = {SEARCH_ROWID.format('OLD.')};
+            INSERT INTO slot_search (rowid, day, teacher, subject) VALUES ({slot_values});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER slots_search_delete AFTER DELETE ON slots
+        BEGIN
+            DELETE FROM slot_search WHERE rowid = {SEARCH_ROWID.format('OLD.')};
+        END
+        ''',
+        '''
+        CREATE TRIGGER teachers_search_insert AFTER INSERT ON teachers
+        BEGIN
+            INSERT INTO teacher_search (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+        ''',
+        f'''
+        CREATE TRIGGER teachers_search_update AFTER UPDATE OF name ON teachers
+        BEGIN
+            UPDATE teacher_search SET name = NEW.name WHERE rowid = NEW.id;
+            UPDATE slot_search SET teacher = NEW.name WHERE rowid IN (
+                SELECT {SEARCH_ROWID.format('k.')} FROM schedules s JOIN slots k ON k.schedule_id = s.id
+                WHERE s.teacher_id = NEW.id
+            );
+        END
+        ''',
+        '''
+        CREATE TRIGGER teachers_search_delete AFTER DELETE ON teachers
+        BEGIN
+            DELETE FROM teacher_search WHERE rowid = OLD.id;
+        END
+        ''',
+    ]
+
+
+def _edit_journal():
+    # Undo/redo journal for batches of cell edits. Each batch keeps the old
+    # and new text of every slot it changed, so undoing or redoing it is
+    # one UPDATE from the journal. is_free now follows any subject change
+    # by trigger, so such writes only need to set subject.
+    return [
+        '''
+        CREATE TABLE edit_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created REAL NOT NULL,
+            undone INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE edit_journal (
+            batch INTEGER NOT NULL REFERENCES edit_batches(id) ON DELETE CASCADE,
+            schedule_id INTEGER NOT NULL,
+            period INTEGER NOT NULL,
+            old_subject TEXT,
+            new_subject TEXT,
+            PRIMARY KEY (batch, schedule_id, period)
+        ) WITHOUT ROWID
+        ''',
+        f'''
+        CREATE TRIGGER slots_subject_free AFTER UPDATE OF subject ON slots
+        WHEN NEW.is_free IS NOT {FREE_SLOTS_IS_FREE_SQL.format('NEW.subject')}
+        BEGIN
+            UPDATE slots SET is_free = {FREE_SLOTS_IS_FREE_SQL.format('NEW.subject')}
+            WHERE schedule_id = NEW.schedule_id AND period = NEW.period;
+        END
+        ''',
+    ]
+
+
+def _plan_modes():
+    # Cached plans are also keyed by the planner that made them, so a search
+    # result is never handed out for a balanced request. The old runs are
+    # only a cache and are dropped rather than guessed a mode.
+    return [
+        'DROP TABLE substitution_runs',
+        '''
+        CREATE TABLE substitution_runs (
+            day TEXT NOT NULL,
+            absentees TEXT NOT NULL,
+            load TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            data_version INTEGER NOT NULL,
+            plan TEXT NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (day, absentees, load, mode)
+        )
+        ''',
+        'CREATE INDEX substitution_runs_last_used ON substitution_runs (last_used)',
+    ]
+
+
+# MIGRATIONS[n] upgrades a database from user_version n to n + 1
+MIGRATIONS = [
+    _legacy_table,
+    _normalize,
+    _change_counter,
+    _date_plans,
+    _free_slots,
+    _paging_indexes,
+    _search_index,
+    _edit_journal,
+    _plan_modes,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    version = schema_version(conn)
+    for target in range(version + 1, LATEST_VERSION + 1):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in MIGRATIONS[target - 1]():
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
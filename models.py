@@ -0,0 +1,283 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor
+
+import engine
+import metrics
+from database import PAGE_SIZE
+from tasks import runner
+
+_END = object()
+
+TIMETABLE_HEADERS = ['ID', 'Day', 'Teacher'] + [f'Period {i + 1}' for i in range(engine.PERIOD_COUNT)]
+FIRST_PERIOD_COLUMN = 3
+STAGED_COLOR = QColor('#fff59d')
+
+
+class TimetableModel(QAbstractTableModel):
+    """Timetable rows shared by the grid views.
+
+    set_rows() diffs the new rows against the current ones by key (the ID
+    column by default) and only emits rowsRemoved, rowsInserted and
+    dataChanged for what actually moved, so views keep their selection and
+    repaint just the touched cells.
+    """
+
+    def __init__(self, headers=TIMETABLE_HEADERS, key=lambda row: row[0], parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.key = key
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        return str(self.rows[index.row()][index.column()])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
+
+    def row(self, row_num):
+        return self.rows[row_num]
+
+    @metrics.timed('qt.set_rows')
+    def set_rows(self, rows):
+        rows = [tuple(row) for row in rows]
+        new_keys = [self.key(row) for row in rows]
+        wanted = set(new_keys)
+
+        # Drop rows that went away, bottom-up in contiguous blocks
+        end = len(self.rows)
+        while end > 0:
+            if self.key(self.rows[end - 1]) in wanted:
+                end -= 1
+                continue
+            start = end - 1
+            while start > 0 and self.key(self.rows[start - 1]) not in wanted:
+                start -= 1
+            self.beginRemoveRows(QModelIndex(), start, end - 1)
+            del self.rows[start:end]
+            self.endRemoveRows()
+            end = start
+
+        # Surviving rows must keep their relative order, otherwise a reset
+        # is cheaper than a chain of moves
+        current = [self.key(row) for row in self.rows]
+        surviving = set(current)
+        kept = [key for key in new_keys if key in surviving]
+        if kept != current or len(wanted) != len(new_keys):
+            self.beginResetModel()
+            self.rows = rows
+            self.endResetModel()
+            return
+
+        pos = 0
+        while pos < len(rows):
+            if pos < len(self.rows) and self.key(self.rows[pos]) == new_keys[pos]:
+                self._update_row(pos, rows[pos])
+                pos += 1
+                continue
+            # Insert the run of new keys up to the next surviving row in one go
+            anchor = self.key(self.rows[pos]) if pos < len(self.rows) else _END
+            stop = pos
+            while stop < len(rows) and new_keys[stop] != anchor:
+                stop += 1
+            self.beginInsertRows(QModelIndex(), pos, stop - 1)
+            self.rows[pos:pos] = rows[pos:stop]
+            self.endInsertRows()
+            pos = stop
+
+    def _update_row(self, row_num, row):
+        old = self.rows[row_num]
+        if old == row:
+            return
+        changed = [col for col in range(len(self.headers)) if old[col:col + 1] != row[col:col + 1]]
+        self.rows[row_num] = row
+        self.dataChanged.emit(self.index(row_num, changed[0]), self.index(row_num, changed[-1]))
+
+
+class PagedModel(TimetableModel):
+    """Rows fetched from the database a page at a time as the view scrolls.
+
+    fetch(task, query, after, limit) runs on a worker thread and returns up
+    to limit rows that follow the row `after` (None for the first page).
+    query is a dict of keyword arguments for the page query; sorting and
+    filtering are part of it, so they happen in SQL and restart paging.
+    """
+
+    def __init__(self, fetch, headers=TIMETABLE_HEADERS, key=lambda row: row[0], page_size=PAGE_SIZE, parent=None):
+        super().__init__(headers, key, parent)
+        self.fetch = fetch
+        self.page_size = page_size
+        self.query = None
+        self.exhausted = True
+
+    def set_query(self, query):
+        self.query = dict(query)
+        self.exhausted = False
+        self.beginResetModel()
+        self.rows = []
+        self.endResetModel()
+        self._load(None, self.page_size, append=True)
+
+    def update_query(self, **changes):
+        if self.query is not None:
+            self.set_query(dict(self.query, **changes))
+
+    def refresh(self):
+        # Reloads as many rows as are loaded now; set_rows keeps the selection
+        if self.query is not None:
+            self._load(None, max(len(self.rows), self.page_size), append=False)
+
+    def show_rows(self, rows):
+        # Rows from somewhere else, e.g. a plan; paging stops until the next query
+        self.cancel()
+        self.query = None
+        self.exhausted = True
+        self.set_rows(rows)
+
+    def cancel(self):
+        # Drops the page load in flight, if any
+        runner().cancel(('page', id(self)))
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not runner().is_running(('page', id(self)))
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._load(self.rows[-1] if self.rows else None, self.page_size, append=True)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.update_query(sort=column, descending=order == Qt.DescendingOrder)
+
+    def _load(self, after, limit, append):
+        runner().submit(
+            ('page', id(self)), self.fetch, self.query, after, limit,
+            on_result=lambda rows: self._loaded(rows, limit, append)
+        )
+
+    def _loaded(self, rows, limit, append):
+        self.exhausted = len(rows) < limit
+        if not append:
+            self.set_rows(rows)
+        elif rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.rows.extend(tuple(row) for row in rows)
+            self.endInsertRows()
+
+
+class EditSessionModel(PagedModel):
+    """Paged timetable rows whose period cells can be edited in place.
+
+    While editing is on, edits are staged here keyed by (id, period), shown
+    highlighted in place of the stored text and kept across paging and
+    refreshes, until they are saved as one batch or discarded.
+    """
+
+    def __init__(self, fetch, parent=None):
+        super().__init__(fetch, parent=parent)
+        self.editing = False
+        self.edits = {}  # (id, period) -> subject
+        self.days = {}  # id -> day of each edited row
+
+    def set_editing(self, editing):
+        self.editing = editing
+        self._repaint()
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if self.editing and index.column() >= FIRST_PERIOD_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.column() < FIRST_PERIOD_COLUMN:
+            return super().data(index, role)
+        cell = (self.rows[index.row()][0], index.column() - FIRST_PERIOD_COLUMN + 1)
+        if cell in self.edits:
+            if role in (Qt.DisplayRole, Qt.EditRole):
+                return self.edits[cell]
+            if role == Qt.BackgroundRole:
+                return STAGED_COLOR
+        return super().data(index, role)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not self.editing or index.column() < FIRST_PERIOD_COLUMN:
+            return False
+        self.stage(index.row(), index.column() - FIRST_PERIOD_COLUMN + 1, value)
+        return True
+
+    def stage(self, row_num, period, subject):
+        # An edit back to the stored text is dropped rather than staged
+        row = self.rows[row_num]
+        cell = (row[0], period)
+        if subject == row[FIRST_PERIOD_COLUMN + period - 1]:
+            self.edits.pop(cell, None)
+        else:
+            self.edits[cell] = subject
+            self.days[row[0]] = row[1]
+        column = FIRST_PERIOD_COLUMN + period - 1
+        self.dataChanged.emit(self.index(row_num, column), self.index(row_num, column))
+
+    def staged(self):
+        # (id, period, subject) for every staged edit
+        return [(id_, period, subject) for (id_, period), subject in self.edits.items()]
+
+    def staged_days(self):
+        return sorted({self.days[id_] for id_, _ in self.edits})
+
+    def discard(self):
+        self.edits.clear()
+        self.days.clear()
+        self._repaint()
+
+    def _repaint(self):
+        if self.rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.rows) - 1, len(self.headers) - 1))
+
+
+class AbsenteeModel(TimetableModel):
+    """Checkable teacher list for picking absentees.
+
+    Checked state lives here, keyed by teacher name, so it survives
+    refreshes and filtering without any widget per teacher.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(headers=['Teacher'], parent=parent)
+        self.checked = set()
+
+    def set_teachers(self, teachers):
+        self.set_rows((teacher,) for teacher in teachers)
+        self.checked &= {row[0] for row in self.rows}
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsUserCheckable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.CheckStateRole and index.isValid():
+            return Qt.Checked if self.rows[index.row()][0] in self.checked else Qt.Unchecked
+        return super().data(index, role)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        teacher = self.rows[index.row()][0]
+        if value == Qt.Checked:
+            self.checked.add(teacher)
+        else:
+            self.checked.discard(teacher)
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def checked_teachers(self):
+        return [row[0] for row in self.rows if row[0] in self.checked]
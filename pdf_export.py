@@ -0,0 +1,164 @@
+import os
+import re
+from concurrent.futures import as_completed
+
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib import colors
+
+import engine
+import metrics
+import plan_cache
+import process_pool
+
+# PDF documents built straight from engine data: the full-day sheet and
+# one slip per substitute teacher. Batch exports render the documents in
+# parallel across the shared process pool; everything passed to the workers is
+# plain tuples so it pickles cheaply.
+
+HEADERS = ['ID', 'Day', 'Teacher'] + [f'Period {i + 1}' for i in range(engine.PERIOD_COUNT)]
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+
+def day_sheet(headers, rows, absentee_names, title='Today\'s Timetable'):
+    stylesheet = getSampleStyleSheet()
+    elements = []
+
+    # Add absentee names at the top
+    absentee_text = 'Absentees: ' + ', '.join(absentee_names) if absentee_names else 'No absentees'
+    elements.append(Paragraph(absentee_text, stylesheet['Normal']))
+    elements.append(Spacer(1, 12))
+
+    elements.append(Paragraph(title, stylesheet['Title']))
+    elements.append(Spacer(1, 12))
+
+    table = Table([list(headers)] + [[str(col_data) for col_data in row] for row in rows])
+    table.setStyle(TABLE_STYLE)
+    elements.append(table)
+    return elements
+
+
+def substitution_slip(day, teacher, duties):
+    # duties: (period index, class, absent teacher)
+    stylesheet = getSampleStyleSheet()
+    elements = [
+        Paragraph(f'Substitution slip: {teacher}', stylesheet['Title']),
+        Paragraph(day, stylesheet['Heading2']),
+        Spacer(1, 12),
+    ]
+    table = Table([['Period', 'Class', 'Covering for']] +
+                  [[f'Period {i + 1}', period, absent] for i, period, absent in sorted(duties)])
+    table.setStyle(TABLE_STYLE)
+    elements.append(table)
+    return elements
+
+
+@metrics.timed('pdf.write')
+def write_pdf(file_name, elements):
+    SimpleDocTemplate(file_name, pagesize=letter).build(elements)
+    return file_name
+
+
+def write_day_sheet(file_name, headers, rows, absentee_names):
+    return write_pdf(file_name, day_sheet(headers, rows, absentee_names))
+
+
+def plan_rows(plan):
+    # Same row shape as the on-screen substituted timetable
+    return [
+        (row_num + 1, plan.day, teacher) + tuple(periods)
+        for row_num, (teacher, periods) in enumerate(plan.timetable.items())
+    ]
+
+
+def plan_jobs(plans, absentees):
+    # One ('sheet', ...) job per day and one ('slip', ...) per substitute
+    jobs = []
+    for plan in plans:
+        title = f'{plan.day} Timetable'
+        jobs.append(('sheet', plan.day, None, (HEADERS, plan_rows(plan), list(absentees), title)))
+        duties = {}
+        for i, absent, period, substitute in plan.assignments:
+            duties.setdefault(substitute, []).append((i, period, absent))
+        for teacher in sorted(duties):
+            jobs.append(('slip', plan.day, teacher, (plan.day, teacher, duties[teacher])))
+    return jobs
+
+
+def job_elements(job):
+    kind, _, _, args = job
+    if kind == 'sheet':
+        return day_sheet(*args)
+    return substitution_slip(*args)
+
+
+def job_file_name(job):
+    kind, day, teacher, _ = job
+    if kind == 'sheet':
+        return f'{day}_timetable.pdf'
+    return f'{day}_slip_{re.sub(r"[^A-Za-z0-9_-]+", "_", teacher)}.pdf'
+
+
+def _render_job(directory, job):
+    return write_pdf(os.path.join(directory, job_file_name(job)), job_elements(job))
+
+
+def export_directory(jobs, directory, workers=None, progress=None):
+    # Renders every job to its own file in parallel; returns the paths.
+    # progress(done, total) may raise to stop the export early.
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    executor = process_pool.get_pool(workers)
+    futures = [executor.submit(_render_job, directory, job) for job in jobs]
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            paths.append(future.result())
+            if progress is not None:
+                progress(done, len(jobs))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return sorted(paths)
+
+
+def export_combined(jobs, file_name, progress=None):
+    # ReportLab lays out one document in a single process, so a combined
+    # file is built sequentially with a page break between documents
+    elements = []
+    for done, job in enumerate(jobs, 1):
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(job_elements(job))
+        if progress is not None:
+            progress(done, len(jobs) + 1)
+    write_pdf(file_name, elements)
+    if progress is not None:
+        progress(len(jobs) + 1, len(jobs) + 1)
+    return [file_name]
+
+
+@metrics.timed('pdf.export_days', rows=len)
+def export_days(days, absentees, target, combined=False, workers=None, progress=None, db_path=engine.DB_PATH):
+    # Plans every day, carrying substitution load over so the week stays
+    # balanced, then writes day sheets and slips to target
+    plans = []
+    load = {}
+    for day in days:
+        plan = plan_cache.cached_plan(day, absentees, db_path, load=load)
+        load.update(plan.load)
+        plans.append(plan)
+    jobs = plan_jobs(plans, absentees)
+    if combined:
+        return export_combined(jobs, target, progress)
+    return export_directory(jobs, target, workers, progress)
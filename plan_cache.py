@@ -0,0 +1,119 @@
+import json
+import threading
+from collections import OrderedDict
+
+import engine
+import metrics
+from database import DB_PATH, get_db
+
+# Memoizes substitution plans by (day, absentees, load carried in, planner
+# mode, data version). Recent plans stay in an in-memory LRU; every plan is also
+# written to substitution_runs so another window or a restart can reuse it.
+# The data version is bumped by triggers on any schedule change, so stale
+# plans are never returned and need no explicit invalidation.
+
+MEMORY_SIZE = 64
+PERSISTED_RUNS = 500
+
+# Planner modes; a search plan and a balanced plan for the same absentees
+# are cached apart
+BALANCED = 'balanced'
+SEARCH = 'search'
+
+
+def _absentees_key(absentees):
+    return json.dumps(sorted(set(absentees)))
+
+
+def _load_key(load):
+    # Teachers with no substitutions yet don't change the plan
+    return json.dumps(sorted((t, n) for t, n in (load or {}).items() if n))
+
+
+class PlanCache:
+    def __init__(self, db_path=DB_PATH, size=MEMORY_SIZE, keep=PERSISTED_RUNS):
+        self.db_path = db_path
+        self.size = size
+        self.keep = keep
+        self.plans = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def plan(self, day, absentees, load=None, progress=None):
+        db = get_db(self.db_path)
+        version = db.data_version()
+        absentees_key = _absentees_key(absentees)
+        load_key = _load_key(load)
+        key = (day, frozenset(absentees), load_key, BALANCED, version)
+
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is not None:
+                self.plans.move_to_end(key)
+                self.hits += 1
+                metrics.count('plan_cache.memory_hit')
+                return plan
+
+        stored = db.substitution_run(day, absentees_key, load_key, BALANCED, version)
+        if stored is not None:
+            plan = engine.SubstitutionPlan.from_dict(json.loads(stored))
+            self.hits += 1
+            metrics.count('plan_cache.stored_hit')
+        else:
+            plan = engine.plan_day(day, absentees, self.db_path, load, progress)
+            db.save_substitution_run(
+                day, absentees_key, load_key, BALANCED, version, json.dumps(plan.to_dict()), self.keep
+            )
+            self.misses += 1
+            metrics.count('plan_cache.miss')
+        self._remember(key, plan)
+        return plan
+
+    def replan(self, plan, absentees):
+        # Incremental update of a committed plan; the result replaces the
+        # cached plan for the new absentee list so later lookups and exports
+        # see the same assignments the teachers were given
+        version = get_db(self.db_path).data_version()
+        new_plan, diff = engine.replan_day(plan, absentees, self.db_path)
+        self.store(new_plan, version)
+        return new_plan, diff
+
+    def store(self, plan, version, load=None, mode=BALANCED):
+        # version must be read before the rows the plan was built from
+        load_key = _load_key(load)
+        get_db(self.db_path).save_substitution_run(
+            plan.day, _absentees_key(plan.absentees), load_key, mode, version, json.dumps(plan.to_dict()), self.keep
+        )
+        self._remember((plan.day, frozenset(plan.absentees), load_key, mode, version), plan)
+
+    def _remember(self, key, plan):
+        with self.lock:
+            self.plans[key] = plan
+            self.plans.move_to_end(key)
+            while len(self.plans) > self.size:
+                self.plans.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.plans.clear()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def cache(db_path=DB_PATH):
+    with _caches_lock:
+        plans = _caches.get(db_path)
+        if plans is None:
+            plans = _caches[db_path] = PlanCache(db_path)
+        return plans
+
+
+def cached_plan(day, absentees, db_path=DB_PATH, load=None, progress=None):
+    return cache(db_path).plan(day, absentees, load, progress)
+
+
+def cached_replan(plan, absentees, db_path=DB_PATH):
+    return cache(db_path).replan(plan, absentees)
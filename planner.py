@@ -0,0 +1,187 @@
+import os
+import random
+import time
+
+import engine
+import metrics
+import process_pool
+from database import DB_PATH, get_db
+
+# Multi-start search for the best substitution plan. Each start builds a
+# plan greedily with seeded noise; every plan is scored and the best one
+# wins. Starts are spread over the shared process pool and each worker
+# keeps going until the time budget runs out.
+#
+# Runs are reproducible: start r of worker w always uses the same seed and
+# ties go to the lowest (w, r). With a time budget the number of starts
+# depends on the machine, so pass `starts` without a budget to get the
+# exact same plan every time.
+
+DEFAULT_BUDGET = 0.5
+
+# Score weights; higher totals are better
+WEIGHTS = {
+    'uncovered': -1000,     # per class nobody covers
+    'balance': -1,          # sum of squared substitution counts
+    'fatigue': -10,         # per period beyond two in a row
+    'same_subject': 5,      # per cover by a teacher who teaches it that day
+}
+
+# How far a random start may stray from the greedy choice
+NOISE = 2.0
+
+
+class PlanScore:
+    def __init__(self, covered, uncovered, balance, fatigue, same_subject, weights=WEIGHTS):
+        self.covered = covered
+        self.uncovered = uncovered
+        self.balance = balance
+        self.fatigue = fatigue
+        self.same_subject = same_subject
+        self.total = (
+            weights['uncovered'] * uncovered + weights['balance'] * balance +
+            weights['fatigue'] * fatigue + weights['same_subject'] * same_subject
+        )
+
+    def __repr__(self):
+        return (f'PlanScore(total={self.total}, covered={self.covered}, uncovered={self.uncovered}, '
+                f'balance={self.balance}, fatigue={self.fatigue}, same_subject={self.same_subject})')
+
+
+def _busy(day_tt, k, i):
+    return not day_tt.free_masks[i] >> k & 1 and bool(day_tt.cell(k, i))
+
+
+def _fatigue(busy_periods):
+    # Periods taught beyond two in a row
+    fatigue = run = 0
+    for busy in busy_periods:
+        run = run + 1 if busy else 0
+        if run > 2:
+            fatigue += 1
+    return fatigue
+
+
+def score_plan(day_tt, plan, weights=WEIGHTS):
+    substitutes = {}
+    for i, _, period, substitute in plan.assignments:
+        substitutes.setdefault(substitute, set()).add(i)
+
+    fatigue = 0
+    same_subject = 0
+    for teacher, periods in substitutes.items():
+        k = day_tt.index[teacher]
+        fatigue += _fatigue(_busy(day_tt, k, i) or i in periods for i in range(engine.PERIOD_COUNT))
+    for i, _, period, substitute in plan.assignments:
+        k = day_tt.index[substitute]
+        if any(day_tt.cell(k, p) == period for p in range(engine.PERIOD_COUNT)):
+            same_subject += 1
+
+    balance = sum(n * n for n in plan.load.values())
+    return PlanScore(len(plan.assignments), len(plan.uncovered), balance, fatigue, same_subject, weights)
+
+
+def randomized_substitute(day_tt, absentees, rng, load=None, weights=WEIGHTS):
+    # Greedy plan: each class goes to the free teacher with the lowest
+    # cost, plus seeded noise so every start explores a different plan
+    absent_mask = day_tt.mask_of(absentees)
+    teachers = day_tt.teachers
+    names = day_tt.subjects.names
+    result = day_tt.copy()
+    load = [0] * len(day_tt) if load is None else [load.get(t, 0) for t in teachers]
+    teaches = [
+        set(day_tt.cells[k * engine.PERIOD_COUNT:(k + 1) * engine.PERIOD_COUNT]) for k in range(len(day_tt))
+    ]
+
+    def cost(k, i, code):
+        # Change in score if k took this class; only periods within two of
+        # i can change k's fatigue
+        window = range(max(0, i - 2), min(engine.PERIOD_COUNT, i + 3))
+        before = [_busy(result, k, p) for p in window]
+        after = [busy or p == i for busy, p in zip(before, window)]
+        return (
+            -weights['balance'] * (2 * load[k] + 1) -
+            weights['fatigue'] * (_fatigue(after) - _fatigue(before)) -
+            weights['same_subject'] * (code in teaches[k]) +
+            rng.random() * NOISE
+        )
+
+    assignments = []
+    uncovered = []
+    for i in range(engine.PERIOD_COUNT):
+        classes = [(j, engine._covers(day_tt, j, i)) for j in engine.iter_bits(absent_mask)]
+        classes = [(j, code) for j, code in classes if code]
+        rng.shuffle(classes)
+        free = set(engine.iter_bits(day_tt.free_masks[i] & ~absent_mask))
+        for j, code in classes:
+            if not free:
+                uncovered.append((i, teachers[j], names[code]))
+                continue
+            k = min(sorted(free), key=lambda k: cost(k, i, code))
+            free.discard(k)
+            result.set_code(k, i, code)
+            load[k] += 1
+            assignments.append((i, teachers[j], names[code], teachers[k]))
+
+    uncovered.sort(key=lambda u: u[0])
+    return engine.SubstitutionPlan(
+        day_tt.day, result.as_dict(absent_mask), assignments, uncovered, dict(zip(teachers, load)), absentees
+    )
+
+
+def _search_worker(day, rows, absentees, load, seed, worker, starts, budget):
+    # Runs starts (worker, 0), (worker, 1), ... until either limit is hit
+    deadline = None if budget is None else time.monotonic() + budget
+    day_tt = engine.DayTimetable(day, rows)
+    best = None
+    r = 0
+    while starts is None or r < starts:
+        if worker == 0 and r == 0:
+            # The load-balanced matching is always one of the candidates
+            plan = engine.balanced_substitute(day_tt, absentees, load)
+        else:
+            rng = random.Random(f'{seed}:{worker}:{r}')
+            plan = randomized_substitute(day_tt, absentees, rng, load)
+        score = score_plan(day_tt, plan)
+        if best is None or score.total > best[0].total:
+            best = (score, (worker, r), plan)
+        r += 1
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+    return best
+
+
+@metrics.timed('planner.search')
+def search(day, rows, absentees, seed=0, budget=DEFAULT_BUDGET, starts=None, load=None, workers=None,
+           progress=None):
+    # Returns (plan, score) for the best plan found. budget is in seconds
+    # and starts is per worker; at least one of them must be set.
+    if budget is None and starts is None:
+        raise ValueError('search needs a time budget or a number of starts')
+    from concurrent.futures import as_completed
+
+    workers = workers or os.cpu_count() or 1
+    rows = [tuple(row) for row in rows]
+    absentees = list(absentees)
+    results = []
+    executor = process_pool.get_pool(workers)
+    futures = [
+        executor.submit(_search_worker, day, rows, absentees, load, seed, w, starts, budget)
+        for w in range(workers)
+    ]
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            results.append(future.result())
+            if progress is not None:
+                progress(done, workers)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    score, _, plan = max(results, key=lambda best: (best[0].total, tuple(-n for n in best[1])))
+    return plan, score
+
+
+def search_day(day, absentees, db_path=DB_PATH, seed=0, budget=DEFAULT_BUDGET, starts=None, load=None,
+               workers=None, progress=None):
+    return search(day, get_db(db_path).rows_for_day(day), absentees, seed, budget, starts, load, workers, progress)
@@ -0,0 +1,37 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pools shared by the plan search, batch PDF exports and coverage
+# sweeps. A pool is started the first time it is asked for and then kept
+# until the program exits, so only the first job pays for starting the
+# workers. Callers run on worker threads, so the workers are spawned rather
+# than forked: a fork would copy any lock another thread holds at that
+# moment (the metrics or plan cache locks) into the child, locked for good.
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def get_pool(workers=None):
+    # One pool per size; a pool whose worker died is replaced
+    workers = workers or os.cpu_count() or 1
+    with _lock:
+        pool = _pools.get(workers)
+        if pool is None or getattr(pool, '_broken', False):
+            if not _pools:
+                atexit.register(shutdown)
+            pool = _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return pool
+
+
+def shutdown():
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
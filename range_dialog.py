@@ -0,0 +1,86 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QFormLayout, QDateEdit, QTableWidget, QDialogButtonBox, QLabel, QMessageBox
+)
+from PyQt5.QtCore import QDate
+
+# Asks for a date range and, for each absentee, the days they are away.
+# Each teacher's dates start out as the whole range.
+
+
+class DateRangeDialog(QDialog):
+    def __init__(self, teachers, parent=None):
+        super().__init__(parent)
+        self.teachers = list(teachers)
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle('Plan Date Range')
+        self.resize(500, 400)
+        mainLayout = QVBoxLayout()
+
+        today = QDate.currentDate()
+        formLayout = QFormLayout()
+        self.firstDateEdit = self.dateEdit(today)
+        self.lastDateEdit = self.dateEdit(today.addDays(13))
+        formLayout.addRow('From:', self.firstDateEdit)
+        formLayout.addRow('To:', self.lastDateEdit)
+        mainLayout.addLayout(formLayout)
+
+        mainLayout.addWidget(QLabel('Days each teacher is away:'))
+        self.absenceTable = QTableWidget(len(self.teachers), 3)
+        self.absenceTable.setHorizontalHeaderLabels(['Teacher', 'From', 'To'])
+        self.absenceTable.verticalHeader().setVisible(False)
+        self.absenceEdits = []
+        for row, teacher in enumerate(self.teachers):
+            self.absenceTable.setCellWidget(row, 0, QLabel(teacher))
+            first = self.dateEdit(self.firstDateEdit.date())
+            last = self.dateEdit(self.lastDateEdit.date())
+            self.absenceTable.setCellWidget(row, 1, first)
+            self.absenceTable.setCellWidget(row, 2, last)
+            self.absenceEdits.append((teacher, first, last))
+        self.absenceTable.resizeColumnsToContents()
+        mainLayout.addWidget(self.absenceTable)
+
+        # Moving the overall range moves every teacher that still matched it
+        self.firstDateEdit.dateChanged.connect(lambda date: self.followRange(1, date))
+        self.lastDateEdit.dateChanged.connect(lambda date: self.followRange(2, date))
+        self.rangeDates = [None, self.firstDateEdit.date(), self.lastDateEdit.date()]
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.checkAndAccept)
+        buttons.rejected.connect(self.reject)
+        mainLayout.addWidget(buttons)
+        self.setLayout(mainLayout)
+
+    def dateEdit(self, date):
+        edit = QDateEdit(date)
+        edit.setCalendarPopup(True)
+        edit.setDisplayFormat('yyyy-MM-dd')
+        return edit
+
+    def followRange(self, column, date):
+        previous = self.rangeDates[column]
+        for edits in self.absenceEdits:
+            if edits[column].date() == previous:
+                edits[column].setDate(date)
+        self.rangeDates[column] = date
+
+    def checkAndAccept(self):
+        if self.firstDateEdit.date() > self.lastDateEdit.date():
+            QMessageBox.warning(self, 'Error', 'The range ends before it starts')
+            return
+        for teacher, first, last in self.absenceEdits:
+            if first.date() > last.date():
+                QMessageBox.warning(self, 'Error', f'The absence of {teacher} ends before it starts')
+                return
+        self.accept()
+
+    def dateRange(self):
+        return self.firstDateEdit.date().toString('yyyy-MM-dd'), self.lastDateEdit.date().toString('yyyy-MM-dd')
+
+    def absences(self):
+        # (teacher, first, last) as ISO dates, ready for range_planner
+        return [
+            (teacher, first.date().toString('yyyy-MM-dd'), last.date().toString('yyyy-MM-dd'))
+            for teacher, first, last in self.absenceEdits
+        ]
@@ -0,0 +1,69 @@
+import datetime
+import json
+
+import engine
+import metrics
+from database import DB_PATH, get_db
+from importer import DAYS
+
+# Substitution plans for every school day in a date range, for absences
+# that span several days (a teacher out for two weeks). All weekdays are
+# loaded in one query and the substitution load is carried from date to
+# date, so the same few teachers don't end up covering the whole range.
+# Every planned date is stored in substitution_dates.
+
+
+def parse_date(text):
+    if isinstance(text, datetime.date):
+        return text
+    return datetime.date.fromisoformat(text)
+
+
+def dates_between(first, last):
+    first, last = parse_date(first), parse_date(last)
+    for n in range((last - first).days + 1):
+        yield first + datetime.timedelta(days=n)
+
+
+def absentees_on(date, absences):
+    # absences: (teacher, first date, last date), both ends included
+    return sorted({
+        teacher for teacher, first, last in absences
+        if parse_date(first) <= date <= parse_date(last)
+    })
+
+
+@metrics.timed('range_planner.plan_range', rows=len)
+def plan_range(first, last, absences, db_path=DB_PATH, progress=None):
+    # Returns [(date, plan)] for the dates in [first, last] that have both
+    # a timetable and at least one absentee
+    absences = [(teacher, parse_date(a), parse_date(b)) for teacher, a, b in absences]
+    dates = [(date, DAYS[date.weekday()], absentees_on(date, absences)) for date in dates_between(first, last)]
+    dates = [(date, day, absentees) for date, day, absentees in dates if absentees]
+
+    db = get_db(db_path)
+    version = db.data_version()
+    week = engine.load_week({day for _, day, _ in dates}, db_path)
+
+    plans = []
+    load = {}
+    for done, (date, day, absentees) in enumerate(dates, 1):
+        if day in week.days:
+            # Load from earlier dates steers cover towards whoever has done least
+            plan = engine.balanced_substitute(week.days[day], absentees, load)
+            load = dict(load)
+            load.update(plan.load)
+            plans.append((date, plan))
+        if progress is not None:
+            progress(done, len(dates))
+
+    db.save_date_plans(
+        (date.isoformat(), plan.day, json.dumps(plan.absentees), version, json.dumps(plan.to_dict()))
+        for date, plan in plans
+    )
+    return plans
+
+
+def stored_plans(first, last, db_path=DB_PATH):
+    rows = get_db(db_path).date_plans(parse_date(first).isoformat(), parse_date(last).isoformat())
+    return [(parse_date(row[0]), engine.SubstitutionPlan.from_dict(json.loads(row[4]))) for row in rows]
@@ -1,20 +1,30 @@
 import sys
-import sqlite3
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QFormLayout, QComboBox, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QMessageBox
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QComboBox, QLineEdit, QPushButton, QTableView,
+    QMessageBox, QFileDialog
 )
 from PyQt5.QtGui import QColor, QPalette, QFont
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt
+from data_watcher import watcher
+from models import EditSessionModel
+from database import get_db
+from importer import import_timetable
+import integrity
+from tasks import runner
+
+def fetch_page(task, query, after, limit):
+    return get_db().schedule_page(after=after, limit=limit, **query)
+
+def run_import(task, file_name):
+    return import_timetable(file_name)
 
 class ScheduleManager(QWidget):
     def __init__(self):
         super().__init__()
         self.initUI()
-        
-        # Timer for auto-refreshing schedule data
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.loadData)
-        self.timer.start(1000)  # Refresh every 1 seconds
+
+        # Reload whenever any window or process changes the database
+        watcher().changed.connect(self.loadData)
 
     def initUI(self):
         self.setWindowTitle('Schedule Manager')
@@ -41,6 +51,11 @@ class ScheduleManager(QWidget):
         self.dayComboBox.addItems(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'])
         mainLayout.addWidget(self.dayComboBox)
 
+        # Filters the grid in SQL by teacher name or period text
+        self.filterLineEdit = QLineEdit()
+        self.filterLineEdit.setPlaceholderText('Filter by teacher or class...')
+        mainLayout.addWidget(self.filterLineEdit)
+
         # Form layout for schedule input
         formLayout = QFormLayout()
 
@@ -61,9 +76,26 @@ class ScheduleManager(QWidget):
         self.addButton = QPushButton('Add Schedule')
         self.updateButton = QPushButton('Update Schedule')
         self.deleteButton = QPushButton('Delete Schedule')
+        self.importButton = QPushButton('Import Timetable')
         buttonLayout.addWidget(self.addButton)
         buttonLayout.addWidget(self.updateButton)
         buttonLayout.addWidget(self.deleteButton)
+        buttonLayout.addWidget(self.importButton)
+
+        # Edit mode: period cells are edited in the grid and saved together
+        # as one batch, which Undo and Redo then revert or repeat
+        editLayout = QHBoxLayout()
+        self.editButton = QPushButton('Edit Mode')
+        self.editButton.setCheckable(True)
+        self.saveEditsButton = QPushButton('Save Edits')
+        self.discardEditsButton = QPushButton('Discard Edits')
+        self.undoButton = QPushButton('Undo')
+        self.redoButton = QPushButton('Redo')
+        editLayout.addWidget(self.editButton)
+        editLayout.addWidget(self.saveEditsButton)
+        editLayout.addWidget(self.discardEditsButton)
+        editLayout.addWidget(self.undoButton)
+        editLayout.addWidget(self.redoButton)
 
         # Set button styles
         button_style = """
@@ -82,15 +114,20 @@ class ScheduleManager(QWidget):
         self.addButton.setStyleSheet(button_style)
         self.updateButton.setStyleSheet(button_style)
         self.deleteButton.setStyleSheet(button_style)
+        self.importButton.setStyleSheet(button_style)
+        for button in (self.editButton, self.saveEditsButton, self.discardEditsButton, self.undoButton, self.redoButton):
+            button.setStyleSheet(button_style)
 
-        # Table to display schedule data
-        self.table = QTableWidget()
-        self.table.setColumnCount(11)  # Assuming 1 ID, 1 Day, 1 Teacher, and 8 periods
-        self.table.setHorizontalHeaderLabels(['ID', 'Day', 'Teacher', 'Period 1', 'Period 2', 'Period 3', 'Period 4', 'Period 5', 'Period 6', 'Period 7', 'Period 8'])
+        # Table to display schedule data, fetched a page at a time as it scrolls
+        self.model = EditSessionModel(fetch_page)  # ID, Day, Teacher and 8 periods
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
 
         # Set table colors and font
         self.table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #e0f2f1;  # Table background color
                 gridline-color: #004d40;    # Table grid color
             }
@@ -99,7 +136,7 @@ class ScheduleManager(QWidget):
                 color: #ffffff;            # Header text color
                 font-size: 16px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 10px;
                 border: 1px solid #004d40;  # Cell border color
                 font-size: 14px;
@@ -110,6 +147,7 @@ class ScheduleManager(QWidget):
         # Add widgets to layout
         mainLayout.addLayout(formLayout)
         mainLayout.addLayout(buttonLayout)
+        mainLayout.addLayout(editLayout)
         mainLayout.addWidget(self.table)
 
         self.setLayout(mainLayout)
@@ -118,24 +156,30 @@ class ScheduleManager(QWidget):
         self.addButton.clicked.connect(self.addSchedule)
         self.updateButton.clicked.connect(self.updateSchedule)
         self.deleteButton.clicked.connect(self.deleteSchedule)
-        self.table.cellClicked.connect(self.loadRecord)
+        self.importButton.clicked.connect(self.importTimetable)
+        self.editButton.toggled.connect(self.toggleEditMode)
+        self.saveEditsButton.clicked.connect(self.saveEdits)
+        self.discardEditsButton.clicked.connect(self.model.discard)
+        self.undoButton.clicked.connect(self.undoEdits)
+        self.redoButton.clicked.connect(self.redoEdits)
+        self.table.clicked.connect(self.loadRecord)
         self.dayComboBox.currentIndexChanged.connect(self.loadData)
+        self.filterLineEdit.textChanged.connect(lambda text: self.model.update_query(search=text.strip()))
 
         # Load data from the database
         self.loadData()
 
     def loadData(self):
         day = self.dayComboBox.currentText()
-        conn = sqlite3.connect('new_timetable.db')
-        c = conn.cursor()
-        c.execute('SELECT * FROM timetable WHERE day = ?', (day,))
-        rows = c.fetchall()
-        conn.close()
-
-        self.table.setRowCount(len(rows))
-        for row_num, row_data in enumerate(rows):
-            for col_num, col_data in enumerate(row_data):
-                self.table.setItem(row_num, col_num, QTableWidgetItem(str(col_data)))
+        # A data change reloads the pages already shown; a new day starts over
+        if self.model.query is not None and self.model.query['day'] == day:
+            self.model.refresh()
+            return
+        header = self.table.horizontalHeader()
+        self.model.set_query({
+            'day': day, 'search': self.filterLineEdit.text().strip(),
+            'sort': header.sortIndicatorSection(), 'descending': header.sortIndicatorOrder() == Qt.DescendingOrder,
+        })
 
     def addSchedule(self):
         day = self.dayComboBox.currentText()
@@ -144,61 +188,127 @@ class ScheduleManager(QWidget):
         if not day or not teacher or any(not period for period in periods):
             QMessageBox.warning(self, 'Error', 'All fields must be filled')
             return
+        if not self.confirmIssues(integrity.check_schedule(day, teacher, periods)):
+            return
 
-        conn = sqlite3.connect('new_timetable.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO timetable (day, teacher, period1, period2, period3, period4, period5, period6, period7, period8) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                  (day, teacher, *periods))
-        conn.commit()
-        conn.close()
-        self.loadData()
+        get_db().add_schedule(day, teacher, periods)
+        watcher().notify()
         self.clearInputs()
 
     def updateSchedule(self):
-        currentRow = self.table.currentRow()
+        currentRow = self.table.currentIndex().row()
         if currentRow < 0:
             QMessageBox.warning(self, 'Error', 'Please select a record to update')
             return
 
-        id_ = self.table.item(currentRow, 0).text()
+        id_ = self.model.row(currentRow)[0]
         day = self.dayComboBox.currentText()
         teacher = self.teacherLineEdit.text()
         periods = [input.text() for input in self.periodInputs]
         if not day or not teacher or any(not period for period in periods):
             QMessageBox.warning(self, 'Error', 'All fields must be filled')
             return
+        if self.model.editing:
+            # Staged with the rest of the session instead of written now
+            for i, period in enumerate(periods):
+                self.model.stage(currentRow, i + 1, period)
+            return
+        if not self.confirmIssues(integrity.check_schedule(day, teacher, periods, id_)):
+            return
 
-        conn = sqlite3.connect('new_timetable.db')
-        c = conn.cursor()
-        c.execute('UPDATE timetable SET day = ?, teacher = ?, period1 = ?, period2 = ?, period3 = ?, period4 = ?, period5 = ?, period6 = ?, period7 = ?, period8 = ? WHERE id = ?',
-                  (day, teacher, *periods, id_))
-        conn.commit()
-        conn.close()
-        self.loadData()
+        get_db().update_schedule(id_, day, teacher, periods)
+        watcher().notify()
         self.clearInputs()
 
+    def toggleEditMode(self, editing):
+        if not editing and self.model.edits:
+            answer = QMessageBox.question(
+                self, 'Unsaved edits', f'Save {len(self.model.edits)} edited periods?',
+                QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel, QMessageBox.Save
+            )
+            if answer == QMessageBox.Cancel or (answer == QMessageBox.Save and not self.saveEdits()):
+                self.editButton.setChecked(True)
+                return
+            self.model.discard()
+        self.model.set_editing(editing)
+
+    def saveEdits(self):
+        # Every staged edit in one transaction, then one refresh
+        edits = self.model.staged()
+        if not edits:
+            return True
+        if not self.confirmIssues(integrity.check_edits(edits, self.model.staged_days())):
+            return False
+        get_db().apply_edits(edits)
+        self.model.discard()
+        watcher().notify()
+        return True
+
+    def undoEdits(self):
+        if get_db().undo_edits() is None:
+            QMessageBox.information(self, 'Undo', 'There are no saved edits to undo')
+            return
+        watcher().notify()
+
+    def redoEdits(self):
+        if get_db().redo_edits() is None:
+            QMessageBox.information(self, 'Redo', 'There are no undone edits to redo')
+            return
+        watcher().notify()
+
+    def confirmIssues(self, issues):
+        # Clashes and odd spellings are allowed, but only once confirmed
+        if not issues:
+            return True
+        answer = QMessageBox.question(
+            self, 'Timetable problems', integrity.summary(issues) + '\n\nSave anyway?',
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        return answer == QMessageBox.Yes
+
     def deleteSchedule(self):
-        currentRow = self.table.currentRow()
+        currentRow = self.table.currentIndex().row()
         if currentRow < 0:
             QMessageBox.warning(self, 'Error', 'Please select a record to delete')
             return
 
-        id_ = self.table.item(currentRow, 0).text()
-        conn = sqlite3.connect('new_timetable.db')
-        c = conn.cursor()
-        c.execute('DELETE FROM timetable WHERE id = ?', (id_,))
-        conn.commit()
-        conn.close()
-        self.loadData()
+        id_ = self.model.row(currentRow)[0]
+        get_db().delete_schedule(id_)
+        watcher().notify()
         self.clearInputs()
 
-    def loadRecord(self, row, column):
-        day = self.table.item(row, 1).text()
-        teacher = self.table.item(row, 2).text()
-        self.dayComboBox.setCurrentText(day)
-        self.teacherLineEdit.setText(teacher)
+    def importTimetable(self):
+        file_name, _ = QFileDialog.getOpenFileName(self, 'Import Timetable', '', 'Timetables (*.csv *.xlsx)')
+        if not file_name:
+            return
+
+        runner().submit(
+            ('import', id(self)), run_import, file_name,
+            on_result=self.importFinished, on_error=self.importFailed
+        )
+
+    def importFailed(self, e):
+        print(f"An error occurred while importing: {e}")
+        QMessageBox.critical(self, 'Error', f'An error occurred while importing: {e}')
+
+    def importFinished(self, result):
+        watcher().notify()
+        message = result.summary()
+        if result.errors:
+            lines = [f'Line {line}: {error}' for line, error in result.errors[:20]]
+            if len(result.errors) > 20:
+                lines.append(f'... and {len(result.errors) - 20} more')
+            message += '\n\n' + '\n'.join(lines)
+        if result.issues:
+            message += '\n\nTimetable problems:\n' + integrity.summary(result.issues)
+        QMessageBox.information(self, 'Import finished', message)
+
+    def loadRecord(self, index):
+        record = self.model.row(index.row())
+        self.dayComboBox.setCurrentText(record[1])
+        self.teacherLineEdit.setText(record[2])
         for i in range(8):
-            self.periodInputs[i].setText(self.table.item(row, i + 3).text())
+            self.periodInputs[i].setText(str(record[i + 3]))
 
     def clearInputs(self):
         self.dayComboBox.setCurrentIndex(0)
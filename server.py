@@ -0,0 +1,249 @@
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import engine
+from database import DB_PATH, ReadOnlyPool
+
+# Local HTTP/JSON service for the bell-schedule display, the staff portal
+# and the messaging bot. Stdlib asyncio only:
+#
+#   GET  /version
+#   GET  /search?q=9B+thursday         slots matching every word, week-wide
+#   GET  /days/<day>/timetable
+#   GET  /days/<day>/free              free teachers for every period
+#   GET  /days/<day>/free?period=3     periods are 1-based
+#   GET  /days/<day>/free?period=3&absent=T1   possible substitutes
+#   GET  /days/<day>/plan?absent=T1&absent=T4
+#   POST /days/<day>/plan              body: {"absentees": ["T1", "T4"]}
+#
+# All database and planning work runs on a thread pool over a pool of
+# read-only connections, so the event loop only parses and writes. Every
+# GET carries an ETag built from the schedule change counter and answers
+# If-None-Match with 304 until the schedules change. Plans are computed
+# here and not written back; the server never writes to the database.
+#
+# App.handle() takes a parsed request and needs no socket, so it can be
+# driven directly against a temporary database.
+
+MAX_BODY = 1 << 20
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+REASONS = {
+    200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error',
+}
+
+
+def read_timetable(db, day):
+    return db.data_version(), db.rows_for_day(day)
+
+
+def read_free(db, day, period, absentees):
+    version = db.data_version()
+    if period is not None:
+        return version, {str(period): db.free_teachers(day, period, absentees)}
+    free = {str(i + 1): [] for i in range(engine.PERIOD_COUNT)}
+    for p, teacher in db.free_grid(day):
+        if teacher not in absentees:
+            free[str(p)].append(teacher)
+    return version, free
+
+
+def read_search(db, text):
+    return db.data_version(), db.search(text)
+
+
+def read_plan(db, day, absentees):
+    version = db.data_version()
+    day_tt = engine.DayTimetable(day, db.rows_for_day(day))
+    return version, engine.balanced_substitute(day_tt, absentees)
+
+
+class App:
+    def __init__(self, db_path=DB_PATH, workers=4):
+        self.pool = ReadOnlyPool(db_path, workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='server-db')
+
+    def close(self):
+        self.executor.shutdown()
+        self.pool.close()
+
+    async def db(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.pool.run, fn, *args)
+
+    async def handle(self, method, target, headers=None, body=b''):
+        # Returns (status, headers, body bytes); headers use lower-case names
+        headers = headers or {}
+        try:
+            return await self.route(method, target, headers, body)
+        except HttpError as e:
+            return self.json(e.status, {'error': str(e)})
+        except Exception as e:
+            return self.json(500, {'error': f'{type(e).__name__}: {e}'})
+
+    async def route(self, method, target, headers, body):
+        if method == 'HEAD':
+            method = 'GET'
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+
+        if parts == ['version']:
+            self.allow(method, 'GET')
+            version = await self.db(lambda db: db.data_version())
+            return self.json(200, {'version': version})
+
+        if parts == ['search']:
+            self.allow(method, 'GET')
+            version, rows = await self.db(read_search, query.get('q', [''])[0])
+            data = {
+                'slots': [
+                    {'day': day, 'period': period, 'teacher': teacher, 'subject': subject}
+                    for day, period, teacher, subject, _ in rows
+                ],
+            }
+            return self.cached(headers, version, data)
+
+        if len(parts) != 3 or parts[0] != 'days':
+            raise HttpError(404, f'no such endpoint: {url.path}')
+        _, day, resource = parts
+
+        if resource == 'timetable':
+            self.allow(method, 'GET')
+            version, rows = await self.db(read_timetable, day)
+            data = {
+                'day': day,
+                'rows': [{'id': row[0], 'teacher': row[2], 'periods': list(row[3:])} for row in rows],
+            }
+            return self.cached(headers, version, data)
+
+        if resource == 'free':
+            self.allow(method, 'GET')
+            period = query.get('period', [None])[0]
+            if period is not None:
+                if not period.isdigit() or not 1 <= int(period) <= engine.PERIOD_COUNT:
+                    raise HttpError(400, f'period must be 1 to {engine.PERIOD_COUNT}')
+                period = int(period)
+            version, free = await self.db(read_free, day, period, set(query.get('absent', [])))
+            return self.cached(headers, version, {'day': day, 'free': free})
+
+        if resource == 'plan':
+            self.allow(method, 'GET', 'POST')
+            if method == 'POST':
+                absentees = self.body_json(body).get('absentees')
+                if not isinstance(absentees, list) or not all(isinstance(t, str) for t in absentees):
+                    raise HttpError(400, '"absentees" must be a list of teacher names')
+            else:
+                absentees = query.get('absent', [])
+            version, plan = await self.db(read_plan, day, sorted(set(absentees)))
+            if method == 'POST':
+                return self.json(200, plan.to_dict(), version)
+            return self.cached(headers, version, plan.to_dict())
+
+        raise HttpError(404, f'no such endpoint: {url.path}')
+
+    def allow(self, method, *methods):
+        if method not in methods:
+            raise HttpError(405, f'use {" or ".join(methods)}')
+
+    def body_json(self, body):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise HttpError(400, 'body is not valid JSON')
+        if not isinstance(data, dict):
+            raise HttpError(400, 'body must be a JSON object')
+        return data
+
+    def cached(self, headers, version, data):
+        etag = f'"v{version}"'
+        if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return 304, {'etag': etag, 'cache-control': 'no-cache'}, b''
+        return self.json(200, data, version)
+
+    def json(self, status, data, version=None):
+        response_headers = {'content-type': 'application/json'}
+        if version is not None:
+            response_headers['etag'] = f'"v{version}"'
+            response_headers['cache-control'] = 'no-cache'
+        return status, response_headers, json.dumps(data).encode()
+
+    async def serve_client(self, reader, writer):
+        # HTTP/1.1 with keep-alive; one request at a time per connection
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.write(writer, 400, {}, b'', close=True)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.write(writer, *self.json(400, {'error': 'bad content-length'}), close=True)
+                    break
+                if length > MAX_BODY:
+                    await self.write(writer, *self.json(413, {'error': 'body too large'}), close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, response_headers, response = await self.handle(method, target, headers, body)
+                close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+                await self.write(writer, status, response_headers, b'' if method == 'HEAD' else response, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def write(self, writer, status, headers, body, close=False):
+        lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        lines.append(f'content-length: {len(body)}')
+        if close:
+            lines.append('connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(db_path=DB_PATH, host='127.0.0.1', port=8080, workers=4):
+    app = App(db_path, workers)
+    server = await asyncio.start_server(app.serve_client, host, port)
+    print(f'Serving {db_path} on http://{host}:{port}')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        app.close()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    try:
+        asyncio.run(serve(port=port))
+    except KeyboardInterrupt:
+        pass
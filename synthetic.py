@@ -0,0 +1,61 @@
+import random
+import sys
+
+import engine
+from database import WORKDAYS, get_db
+
+# Reproducible made-up schools for benchmarks and trying things out. The
+# same arguments always give the same timetable.
+
+SUBJECTS = ['MATH', 'ENG', 'SCI', 'HIST', 'GEO', 'ART', 'MUS', 'PE', 'CHEM', 'PHYS', 'BIO', 'CS']
+GRADES = range(6, 13)
+SECTIONS = 'ABCD'
+
+
+def teacher_names(teachers):
+    return [f'T{n + 1}' for n in range(teachers)]
+
+
+def generate_school(teachers, periods=engine.PERIOD_COUNT, free_ratio=0.25, days=WORKDAYS, seed=0):
+    # Returns (day, teacher, *periods) records for Database.upsert_schedules.
+    # Each teacher teaches two subjects; `periods` slots a day are used and
+    # free_ratio of them are FREE. Slots after `periods` are left empty,
+    # which counts as free.
+    if not 0 < periods <= engine.PERIOD_COUNT:
+        raise ValueError(f'periods must be between 1 and {engine.PERIOD_COUNT}')
+    rng = random.Random(seed)
+    records = []
+    for teacher in teacher_names(teachers):
+        subjects = rng.sample(SUBJECTS, 2)
+        for day in days:
+            slots = []
+            for _ in range(periods):
+                if rng.random() < free_ratio:
+                    slots.append('FREE')
+                else:
+                    slots.append(f'{rng.choice(subjects)} {rng.choice(GRADES)}{rng.choice(SECTIONS)}')
+            slots += [None] * (engine.PERIOD_COUNT - periods)
+            records.append((day, teacher, *slots))
+    return records
+
+
+def pick_absentees(teachers, absentee_rate=0.05, seed=0):
+    # At least one absentee so there is always something to plan
+    names = teacher_names(teachers)
+    count = max(1, round(len(names) * absentee_rate))
+    return sorted(random.Random(seed).sample(names, count))
+
+
+def build_database(db_path, teachers, periods=engine.PERIOD_COUNT, free_ratio=0.25, seed=0):
+    db = get_db(db_path)
+    db.migrate()
+    return db.upsert_schedules(generate_school(teachers, periods, free_ratio, seed=seed))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 4):
+        print('Usage: python synthetic.py <database> <teachers> [free ratio]')
+        sys.exit(2)
+    free_ratio = float(sys.argv[3]) if len(sys.argv) == 4 else 0.25
+    inserted, updated = build_database(sys.argv[1], int(sys.argv[2]), free_ratio=free_ratio)
+    print(f'{inserted} schedules added, {updated} updated')
@@ -0,0 +1,123 @@
+import time
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+import metrics
+
+# Runs slow work (queries, substitution planning, PDF rendering) on
+# QThreadPool threads and posts the results back to the GUI thread.
+#
+# Every job is submitted under a key such as ('day', window). Submitting a
+# new job under the same key cancels the old one and any result it still
+# produces is dropped, so a quick day switch never shows stale rows.
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Task(QRunnable):
+    def __init__(self, runner, key, generation, fn, args):
+        # autoDelete stays on: the pool owns the runnable until run() returns,
+        # even after the runner has replaced it and dropped its reference
+        super().__init__()
+        self.runner = runner
+        self.key = key
+        self.generation = generation
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def report(self, done, total):
+        # Progress callback for the job; also where cancellation lands
+        self.check()
+        self.runner.progressed.emit(self.key, self.generation, done, total)
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            result = self.fn(self, *self.args)
+        except Cancelled:
+            return
+        except Exception as e:
+            self.runner.failed.emit(self.key, self.generation, e)
+        else:
+            self.runner.finished.emit(self.key, self.generation, result)
+        finally:
+            if metrics.enabled():
+                metrics.record(f'task.{self.fn.__name__}', time.perf_counter() - start, start=start)
+
+
+class TaskRunner(QObject):
+    # Emitted from worker threads; the slots below run on the GUI thread
+    finished = pyqtSignal(object, int, object)
+    failed = pyqtSignal(object, int, object)
+    progressed = pyqtSignal(object, int, int, int)
+
+    def __init__(self, pool=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self.generation = 0
+        self.current = {}  # key -> (task, on_result, on_error, on_progress)
+        self.finished.connect(self._on_finished)
+        self.failed.connect(self._on_failed)
+        self.progressed.connect(self._on_progress)
+
+    def submit(self, key, fn, *args, on_result=None, on_error=None, on_progress=None):
+        # fn is called as fn(task, *args) on a worker thread
+        self.cancel(key)
+        self.generation += 1
+        task = Task(self, key, self.generation, fn, args)
+        self.current[key] = (task, on_result, on_error, on_progress)
+        self.pool.start(task)
+        return task
+
+    def cancel(self, key):
+        entry = self.current.pop(key, None)
+        if entry is not None:
+            entry[0].cancelled = True
+
+    def is_running(self, key):
+        return key in self.current
+
+    def _take(self, key, generation):
+        entry = self.current.get(key)
+        if entry is None or entry[0].generation != generation:
+            return None  # superseded or cancelled
+        del self.current[key]
+        return entry
+
+    @pyqtSlot(object, int, object)
+    def _on_finished(self, key, generation, result):
+        entry = self._take(key, generation)
+        if entry is not None and entry[1] is not None:
+            entry[1](result)
+
+    @pyqtSlot(object, int, object)
+    def _on_failed(self, key, generation, error):
+        entry = self._take(key, generation)
+        if entry is None:
+            return
+        if entry[2] is not None:
+            entry[2](error)
+        else:
+            print(f"A background task failed: {error}")
+
+    @pyqtSlot(object, int, int, int)
+    def _on_progress(self, key, generation, done, total):
+        entry = self.current.get(key)
+        if entry is not None and entry[0].generation == generation and entry[3] is not None:
+            entry[3](done, total)
+
+
+_runner = None
+
+
+def runner():
+    global _runner
+    if _runner is None:
+        _runner = TaskRunner()
+    return _runner
@@ -1,15 +1,25 @@
 import sys
 import sqlite3
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem, QMessageBox, QLineEdit
+    QApplication, QWidget, QVBoxLayout, QPushButton, QTableView, QMessageBox, QLineEdit
 )
 from PyQt5.QtGui import QColor, QPalette, QFont
+from PyQt5.QtCore import Qt
+from data_watcher import watcher
+from database import get_db
+from models import PagedModel
+
+def fetch_page(task, query, after, limit):
+    return get_db().teacher_page(after=after, limit=limit, **query)
 
 class TeacherManager(QWidget):
     def __init__(self):
         super().__init__()
         self.initUI()
 
+        # Reload whenever any window or process changes the database
+        watcher().changed.connect(self.loadData)
+
     def initUI(self):
         self.setWindowTitle('Teacher Manager')
         self.setGeometry(100, 100, 800, 600)
@@ -66,14 +76,20 @@ class TeacherManager(QWidget):
         self.updateButton.setStyleSheet(button_style)
         self.deleteButton.setStyleSheet(button_style)
 
-        # Table to display teacher names
-        self.table = QTableWidget()
-        self.table.setColumnCount(1)
-        self.table.setHorizontalHeaderLabels(['Teacher Name'])
+        # Filters the list in SQL as you type
+        self.filterInput = QLineEdit()
+        self.filterInput.setPlaceholderText('Filter teachers...')
+
+        # Table to display teacher names, fetched a page at a time as it scrolls
+        self.model = PagedModel(fetch_page, headers=['Teacher Name'])
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
 
         # Set table colors and font
         self.table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #e0f2f1;  # Table background color
                 gridline-color: #004d40;    # Table grid color
             }
@@ -82,7 +98,7 @@ class TeacherManager(QWidget):
                 color: #ffffff;            # Header text color
                 font-size: 16px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 10px;
                 border: 1px solid #004d40;  # Cell border color
                 font-size: 14px;
@@ -93,6 +109,7 @@ class TeacherManager(QWidget):
         # Add widgets to layout
         mainLayout.addLayout(inputLayout)
         mainLayout.addLayout(buttonLayout)
+        mainLayout.addWidget(self.filterInput)
         mainLayout.addWidget(self.table)
 
         self.setLayout(mainLayout)
@@ -101,7 +118,8 @@ class TeacherManager(QWidget):
         self.updateButton.clicked.connect(self.updateTeacher)
         self.deleteButton.clicked.connect(self.deleteTeacher)
         self.addButton.clicked.connect(self.addTeacher)
-        self.table.cellClicked.connect(self.loadRecord)
+        self.table.clicked.connect(self.loadRecord)
+        self.filterInput.textChanged.connect(lambda text: self.model.update_query(search=text.strip()))
 
         # Initialize button states
         self.updateButton.setEnabled(False)
@@ -112,72 +130,54 @@ class TeacherManager(QWidget):
         self.loadData()
 
     def loadData(self):
-        conn = sqlite3.connect('new_timetable.db')
-        c = conn.cursor()
-        c.execute('SELECT DISTINCT teacher FROM timetable')
-        rows = c.fetchall()
-        conn.close()
-
-        self.table.setRowCount(len(rows))
-        for row_num, row_data in enumerate(rows):
-            self.table.setItem(row_num, 0, QTableWidgetItem(row_data[0]))
+        # Pages are fetched off the GUI thread; a data change reloads the ones shown
+        if self.model.query is not None:
+            self.model.refresh()
+            return
+        self.model.set_query({'search': self.filterInput.text().strip(), 'descending': False})
 
     def updateTeacher(self):
-        currentRow = self.table.currentRow()
+        currentRow = self.table.currentIndex().row()
         if currentRow < 0:
             QMessageBox.warning(self, 'Error', 'Please select a record to update')
             return
 
-        old_teacher = self.table.item(currentRow, 0).text()
+        old_teacher = self.model.row(currentRow)[0]
         new_teacher = self.teacherNameInput.text().strip()
         if new_teacher:
-            conn = sqlite3.connect('new_timetable.db')
-            c = conn.cursor()
-            c.execute('UPDATE timetable SET teacher = ? WHERE teacher = ?', (new_teacher, old_teacher))
-            conn.commit()
-            conn.close()
-            self.loadData()
+            try:
+                get_db().rename_teacher(old_teacher, new_teacher)
+            except sqlite3.Error as e:
+                QMessageBox.critical(self, 'Error', f'Could not rename {old_teacher}: {e}')
+                return
+            watcher().notify()
             self.resetInput()
         else:
             QMessageBox.warning(self, 'Error', 'Teacher name cannot be empty')
 
     def deleteTeacher(self):
-        currentRow = self.table.currentRow()
+        currentRow = self.table.currentIndex().row()
         if currentRow < 0:
             QMessageBox.warning(self, 'Error', 'Please select a record to delete')
             return
 
-        teacher = self.table.item(currentRow, 0).text()
-        conn = sqlite3.connect('new_timetable.db')
-        c = conn.cursor()
-        c.execute('DELETE FROM timetable WHERE teacher = ?', (teacher,))
-        conn.commit()
-        conn.close()
-        self.loadData()
+        teacher = self.model.row(currentRow)[0]
+        get_db().delete_teacher(teacher)
+        watcher().notify()
         self.resetInput()
 
     def addTeacher(self):
         teacher_name = self.teacherNameInput.text().strip()
         if teacher_name:
-            conn = sqlite3.connect('new_timetable.db')
-            c = conn.cursor()
-            # Insert teacher and set all periods to "None" for each workday
-            workdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-            periods = ['None'] * 8
-            for day in workdays:
-                c.execute(
-                    'INSERT INTO timetable (teacher, day, period1, period2, period3, period4, period5, period6, period7, period8) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                    (teacher_name, day, *periods)
-                )
-            conn.commit()
-            conn.close()
+            # Insert teacher and set all periods to FREE for each workday
+            get_db().add_teacher(teacher_name)
             self.teacherNameInput.clear()
-            self.loadData()
+            watcher().notify()
         else:
             QMessageBox.warning(self, 'Error', 'Teacher name cannot be empty')
 
-    def loadRecord(self, row, column):
-        teacher_name = self.table.item(row, column).text()
+    def loadRecord(self, index):
+        teacher_name = self.model.row(index.row())[0]
         self.teacherNameInput.setText(teacher_name)
         self.updateButton.setEnabled(True)
         self.deleteButton.setEnabled(True)